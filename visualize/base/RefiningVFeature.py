@@ -1,17 +1,22 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
-from OCC.Core.TopAbs import TopAbs_EDGE, TopAbs_FACE
-from OCC.Core.TopExp import TopExp_Explorer
-from OCC.Core.TopoDS import TopoDS_Shape, TopoDS_Edge, TopoDS_Face, topods
+import numpy as np
 
-from visualize.utils.occ_compare_edge_utils import is_equal_any, is_edges_intersected_any
-from visualize.utils.occ_compare_face_utils import is_faces_intersected_any
 from visualize.base.BaseVFeature import BaseVFeature
 from visualize.modules.Sketch import Sketch
 from visualize.macro import CapType
 from visualize.base.SketchBasedVFeature import SketchBasedVFeature
 from visualize.modules.Extrude import Extrude
 from visualize.modules.Revolve import Revolve
+from visualize.utils.profiler import profile_stage
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape, TopoDS_Edge, TopoDS_Face
+    from visualize.utils.entity_tracker import EntityTracker
+    from visualize.utils.profiler import Profiler
 
 
 class RefiningVFeature(BaseVFeature, ABC):
@@ -21,52 +26,169 @@ class RefiningVFeature(BaseVFeature, ABC):
         self.strict = strict
         self.debug = debug
 
-    def resolve_entities_to_topods(self, skt: Sketch, skt_op: SketchBasedVFeature) -> dict[str, list[TopoDS_Shape]]:
-        entities_topods = {"faces": [], "edges": []}
+    def resolve_entities_to_topods(self, skt: Sketch, skt_op: SketchBasedVFeature, s: TopoDS_Shape = None,
+                                   tracker: EntityTracker = None) -> dict[str, list[TopoDS_Shape]]:
+        """
+        Reference shapes of the entities, which are located in the shape geometrically ("edges"/"faces").
+        With a `tracker`, entities are first resolved by the modeling history to sub-shapes of `s`
+        ("tracked_edges"/"tracked_faces"), only the entities that can not be tracked are left to the search.
+        """
+        entities_topods = {"faces": [], "edges": [], "tracked_faces": [], "tracked_edges": []}
+        all_topods = []
+        tracked_topods = []
+        swept_topods = {}  # reference id -> sketch topology, swept together below
         for entity in self.entities:
             ref_id = entity["referenceId"]
             cap_type = CapType[entity["capType"]]
             topods = skt.find_id(ref_id)
             if topods is None:
                 raise AssertionError(f"Reference Id `{ref_id}` can not found in the Sketch.")
+            if tracker is not None:
+                tracked = tracker.resolve(topods, cap_type, s)
+                if tracked is not None:
+                    tracked_topods.extend(tracked)
+                    continue
             if cap_type == CapType.SWEPT:
-                # this may result in TopoDS-related errors; see SketchBasedFeature._resolve_cap_entities().
-                # such cases should be considered failures of model generation.
-                if isinstance(skt_op, Extrude):
-                    entity_topods = skt_op._op(topods, skt.plane["normal"])
-                elif isinstance(skt_op, Revolve):
-                    entity_topods = skt_op._op(topods)
-                else:
-                    raise ValueError(f"Unknown SketchBasedVFeature type: {type(skt_op)}")
+                swept_topods.setdefault(ref_id, topods)
             else:
-                entity_topods = skt_op.transform(topods, cap_type, param={"normal": skt.plane["normal"]})
+                all_topods.append(skt_op.transform(topods, cap_type, param={"normal": skt.plane["normal"]}))
+        if swept_topods:
+            all_topods.extend(self.sweep_all(list(swept_topods.values()), skt, skt_op))
 
-            if isinstance(entity_topods, TopoDS_Edge):
-                entities_topods["edges"].append(entity_topods)
-            elif isinstance(entity_topods, TopoDS_Face):
-                entities_topods["faces"].append(entity_topods)
+        entities_topods["edges"], entities_topods["faces"] = self.split_edges_faces(all_topods)
+        entities_topods["tracked_edges"], entities_topods["tracked_faces"] = self.split_edges_faces(tracked_topods)
         return entities_topods
 
+    @staticmethod
+    def split_edges_faces(shapes: list[TopoDS_Shape]) -> tuple[list[TopoDS_Edge], list[TopoDS_Face]]:
+        from OCC.Core.TopAbs import TopAbs_EDGE, TopAbs_FACE
+        from OCC.Core.TopoDS import topods
+        edges, faces = [], []
+        for shape in shapes:
+            if shape.ShapeType() == TopAbs_EDGE:
+                edges.append(topods.Edge(shape))
+            elif shape.ShapeType() == TopAbs_FACE:
+                faces.append(topods.Face(shape))
+        return edges, faces
+
+    @staticmethod
+    def sweep(s: TopoDS_Shape, skt: Sketch, skt_op: SketchBasedVFeature) -> TopoDS_Shape:
+        # this may result in TopoDS-related errors; see SketchBasedFeature._resolve_cap_entities().
+        # such cases should be considered failures of model generation.
+        if isinstance(skt_op, Extrude):
+            return skt_op._op(s, skt.plane["normal"])
+        elif isinstance(skt_op, Revolve):
+            return skt_op._op(s)
+        raise ValueError(f"Unknown SketchBasedVFeature type: {type(skt_op)}")
+
+    @staticmethod
+    def sweep_all(shapes: list[TopoDS_Shape], skt: Sketch, skt_op: SketchBasedVFeature) -> list[TopoDS_Shape]:
+        """
+        sweep all `shapes` (vertices/edges of the sketch) with a single prism/revolution of their compound,
+        the swept compound is split back into its children. Falls back to sweeping the shapes one by one.
+        """
+        from OCC.Core.BRep import BRep_Builder
+        from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Iterator
+        if len(shapes) == 1:
+            return [RefiningVFeature.sweep(shapes[0], skt, skt_op)]
+
+        builder = BRep_Builder()
+        compound = TopoDS_Compound()
+        builder.MakeCompound(compound)
+        for s in shapes:
+            builder.Add(compound, s)
+        swept = []
+        try:
+            iterator = TopoDS_Iterator(RefiningVFeature.sweep(compound, skt, skt_op))
+            while iterator.More():
+                swept.append(iterator.Value())
+                iterator.Next()
+        except RuntimeError:
+            swept = []
+        if len(swept) != len(shapes):
+            swept = [RefiningVFeature.sweep(s, skt, skt_op) for s in shapes]
+        return swept
+
     @abstractmethod
-    def _op(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]]) -> TopoDS_Shape:
+    def _op(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]], tracker: EntityTracker = None,
+            profiler: Profiler = None) -> TopoDS_Shape:
+        """
+        apply the feature to `s`, and `tracker.record()` its maker if a tracker is given.
+        The "locate_edges" (shells: "locate_faces") stage and the kernel (stage named as `feat_type`) are
+        recorded by `profiler`.
+        """
         pass
 
+    def get_target_edges(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]]) -> list[TopoDS_Edge]:
+        """edges of `s` the feature is applied to: the located reference edges and edges of reference faces"""
+        from OCC.Core.TopAbs import TopAbs_EDGE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopoDS import topods
+        targets = self.locate_edges(s, entities["edges"], self.strict)
+        targets += self.locate_edges_from_faces(s, entities["faces"], self.strict)
+        tracked_edges = list(entities.get("tracked_edges", []))
+        for face in entities.get("tracked_faces", []):
+            explorer = TopExp_Explorer(face, TopAbs_EDGE)
+            while explorer.More():
+                tracked_edges.append(topods.Edge(explorer.Current()))
+                explorer.Next()
+        for edge in tracked_edges:
+            if not any(edge.IsSame(target) for target in targets):
+                targets.append(edge)
+        return targets
+
+    def get_target_faces(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]]) -> list[TopoDS_Face]:
+        """faces of `s` the feature is applied to"""
+        targets = self.locate_faces(s, entities["faces"])
+        for face in entities.get("tracked_faces", []):
+            if not any(face.IsSame(target) for target in targets):
+                targets.append(face)
+        return targets
+
     @staticmethod
     def locate_edges(s: TopoDS_Shape, ref_edges: list[TopoDS_Shape], strict: bool) -> list[TopoDS_Edge]:
-        targets = []
+        from OCC.Core.TopAbs import TopAbs_EDGE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopoDS import topods
+        from visualize.utils.math_utils import bbox_overlaps
+        from visualize.utils.occ_compare_edge_utils import get_edge_signatures, match_edge_signatures, \
+            is_edges_intersected_any
+        from visualize.utils.occ_utils import get_bboxes
+        edges = []
         explorer = TopExp_Explorer(s, TopAbs_EDGE)
         while explorer.More():
             edge = topods.Edge(explorer.Current())
             explorer.Next()
+            if edge.Orientation():
+                edges.append(edge)
+        if not edges or not ref_edges:
+            return []
 
-            if edge.Orientation() and is_equal_any(edge, ref_edges):
-                targets.append(edge)
-            elif not strict and edge.Orientation() and is_edges_intersected_any(edge, ref_edges):
-                targets.append(edge)
+        # only reference edges whose bounding boxes overlap the edge can be equal to / intersect it
+        candidates = bbox_overlaps(get_bboxes(edges), get_bboxes(ref_edges))
+        candidate_ids = np.flatnonzero(candidates.any(axis=1))
+        if len(candidate_ids) == 0:
+            return []
+        # `is_equal` of all candidate pairs at once, each edge is queried from OCC only once
+        equal = np.zeros_like(candidates)
+        equal[candidate_ids] = match_edge_signatures(get_edge_signatures([edges[i] for i in candidate_ids]),
+                                                     get_edge_signatures(ref_edges))
+        equal &= candidates
+        targets = []
+        for i in candidate_ids:
+            if equal[i].any():
+                targets.append(edges[i])
+            elif not strict:
+                refs = [ref_edge for ref_edge, m in zip(ref_edges, candidates[i]) if m]
+                if is_edges_intersected_any(edges[i], refs):
+                    targets.append(edges[i])
         return targets
 
     @staticmethod
     def locate_edges_from_faces(s: TopoDS_Shape, ref_faces: list[TopoDS_Shape], strict: bool) -> list[TopoDS_Edge]:
+        from OCC.Core.TopAbs import TopAbs_EDGE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopoDS import topods
         ref_edges = []
         for face in ref_faces:
             explorer = TopExp_Explorer(face, TopAbs_EDGE)
@@ -78,18 +200,34 @@ class RefiningVFeature(BaseVFeature, ABC):
 
     @staticmethod
     def locate_faces(s: TopoDS_Shape, ref_faces: list[TopoDS_Shape]) -> list[TopoDS_Face]:
-        targets = []
+        from OCC.Core.TopAbs import TopAbs_FACE
+        from OCC.Core.TopExp import TopExp_Explorer
+        from OCC.Core.TopoDS import topods
+        from visualize.utils.math_utils import bbox_overlaps
+        from visualize.utils.occ_compare_face_utils import get_face_planes, match_face_planes, is_section_closed
+        from visualize.utils.occ_utils import get_bboxes
+        faces = []
         explorer = TopExp_Explorer(s, TopAbs_FACE)
         while explorer.More():
-            face = topods.Face(explorer.Current())
+            faces.append(topods.Face(explorer.Current()))
             explorer.Next()
-            if is_faces_intersected_any(face, ref_faces):
+        if not faces or not ref_faces:
+            return []
+
+        # reject pairs of different surface types or non-coplanar planes at once, before running any Section
+        candidates = bbox_overlaps(get_bboxes(faces), get_bboxes(ref_faces))
+        candidates &= match_face_planes(get_face_planes(faces), get_face_planes(ref_faces))
+        targets = []
+        for face, mask in zip(faces, candidates):
+            if any(is_section_closed(face, ref_face) for ref_face, m in zip(ref_faces, mask) if m):
                 targets.append(face)
         return targets
 
-    def op(self, s: TopoDS_Shape, skt: Sketch, skt_op: SketchBasedVFeature) -> TopoDS_Shape:
-        entities = self.resolve_entities_to_topods(skt, skt_op)
-        s = self._op(s, entities)
+    def op(self, s: TopoDS_Shape, skt: Sketch, skt_op: SketchBasedVFeature, tracker: EntityTracker = None,
+           profiler: Profiler = None) -> TopoDS_Shape:
+        with profile_stage(profiler, "resolve_entities"):
+            entities = self.resolve_entities_to_topods(skt, skt_op, s, tracker)
+        s = self._op(s, entities, tracker, profiler)
         return s
 
     def get_code(self, param: dict):
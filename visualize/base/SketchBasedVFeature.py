@@ -1,39 +1,120 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
-from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Fuse, BRepAlgoAPI_Common, BRepAlgoAPI_Cut
-from OCC.Core.TopoDS import TopoDS_Shape
+import numpy as np
 from visualize.macro import *
 from visualize.base.BaseVFeature import BaseVFeature
 from visualize.modules.Sketch import Sketch
 
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+    from visualize.utils.entity_tracker import EntityTracker
+    from visualize.utils.profiler import Profiler
+
 
 class SketchBasedVFeature(BaseVFeature, ABC):
-    def __init__(self, feat_name, feat_id, feat_type, parameters):
+    def __init__(self, feat_name, feat_id, feat_type, parameters, use_location=False):
         super().__init__(feat_name, feat_id, feat_type, parameters)
+        self.use_location = use_location  # apply rigid placements as shape locations instead of copies
+
+    def place(self, s: TopoDS_Shape, trsf):
+        """
+        apply the rigid transformation `trsf` to `s`. Returns the placed shape and what placed it: a TopLoc_Location
+        which shares the geometry of `s` if `use_location`, else a BRepBuilderAPI_Transform which copies it.
+        """
+        if self.use_location:
+            from OCC.Core.TopLoc import TopLoc_Location
+            location = TopLoc_Location(trsf)
+            return s.Moved(location), location
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
+        transform = BRepBuilderAPI_Transform(s, trsf)
+        return transform.Shape(), transform
 
     @abstractmethod
-    def op(self, sketch: Sketch) -> TopoDS_Shape:
+    def op(self, sketch: Sketch, tracker: EntityTracker = None, profiler: Profiler = None) -> TopoDS_Shape:
         pass
 
     @abstractmethod
     def transform(self, s: TopoDS_Shape, cap_type: CapType, param=None) -> TopoDS_Shape:
         pass
 
+    @abstractmethod
+    def estimate_bbox(self, sketch: Sketch) -> np.ndarray:
+        """conservative bounding box (min/max points) of `op(sketch)`, computed without OCC"""
+        pass
+
+    @abstractmethod
+    def get_sweep_range(self) -> tuple[float, float]:
+        """offsets (or angles) of the first and the last end of the sweep built by `_op`"""
+        pass
+
+    @abstractmethod
+    def get_cap_positions(self) -> dict[CapType, float]:
+        """offsets (or angles) `transform` moves the sketch to for CapType.START and CapType.END"""
+        pass
+
+    def get_cap_sides(self) -> dict[CapType, str]:
+        """the end of the sweep ("first"/"last") each cap lies on, caps lying on neither end are left out"""
+        first, last = self.get_sweep_range()
+        cap_sides = {}
+        for cap_type, position in self.get_cap_positions().items():
+            if np.isclose(position, first):
+                cap_sides[cap_type] = "first"
+            elif np.isclose(position, last):
+                cap_sides[cap_type] = "last"
+        return cap_sides
+
+    @staticmethod
+    def run_boolean(algo, arguments: list[TopoDS_Shape], tools: list[TopoDS_Shape], parallel=False,
+                    fuzzy_value=0.0) -> TopoDS_Shape:
+        """
+        run a BRepAlgoAPI boolean operation with multiple arguments / tools. It runs in non-destructive mode:
+        the inputs may share sub-shapes with other shapes (e.g. cached sketch faces), which must not be modified.
+        """
+        from OCC.Core.TopTools import TopTools_ListOfShape
+        argument_list, tool_list = TopTools_ListOfShape(), TopTools_ListOfShape()
+        for s in arguments:
+            argument_list.Append(s)
+        for s in tools:
+            tool_list.Append(s)
+        algo.SetArguments(argument_list)
+        algo.SetTools(tool_list)
+        algo.SetRunParallel(parallel)
+        algo.SetNonDestructive(True)
+        if fuzzy_value > 0:
+            algo.SetFuzzyValue(fuzzy_value)
+        algo.Build()
+        return algo.Shape()
+
+    @staticmethod
+    def op_fuse_all(body: TopoDS_Shape, tools: list[TopoDS_Shape], parallel=False, fuzzy_value=0.0) -> TopoDS_Shape:
+        """union of `body` and all `tools` in a single boolean operation"""
+        from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Fuse
+        shapes = [s for s in [body] + tools if s is not None and not s.IsNull()]
+        if len(shapes) <= 1:
+            return shapes[0] if shapes else body
+        return SketchBasedVFeature.run_boolean(BRepAlgoAPI_Fuse(), shapes[:1], shapes[1:], parallel, fuzzy_value)
+
     @staticmethod
-    def op_boolean(body1: TopoDS_Shape, body2: TopoDS_Shape, boolean_op: BooleanOp) -> TopoDS_Shape:
+    def op_boolean(body1: TopoDS_Shape, body2: TopoDS_Shape, boolean_op: BooleanOp, parallel=False,
+                   fuzzy_value=0.0) -> TopoDS_Shape:
+        from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Fuse, BRepAlgoAPI_Common, BRepAlgoAPI_Cut
         if body1 is None or body1.IsNull():
             s = body2
         elif body2 is None or body2.IsNull():
             s = body1
         else:
             if boolean_op in [BooleanOp.NEW, BooleanOp.ADD]:
-                s = BRepAlgoAPI_Fuse(body1, body2).Shape()
+                algo = BRepAlgoAPI_Fuse()
             elif boolean_op == BooleanOp.REMOVE:
-                s = BRepAlgoAPI_Cut(body1, body2).Shape()
+                algo = BRepAlgoAPI_Cut()
             elif boolean_op == BooleanOp.INTERSECT:
-                s = BRepAlgoAPI_Common(body1, body2).Shape()
+                algo = BRepAlgoAPI_Common()
             else:
                 raise NotImplemented(f"Boolean operation {boolean_op} is not implemented.")
+            s = SketchBasedVFeature.run_boolean(algo, [body1], [body2], parallel, fuzzy_value)
         # # ======= Visualized DEBUG =======
         # from OCC.Display.SimpleGui import init_display
         # display, start_display, add_menu, add_function_to_menu = init_display()
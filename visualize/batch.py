@@ -0,0 +1,336 @@
+"""
+Batch builder for the Seek-CAD JSON corpus.
+
+Builds every JSON model of a directory (or list of files / directories) with
+`CADSequence.from_dict(...).create_CAD()` across a process pool, and writes per-model outputs
+into `out_dir`:
+    <model>.step / <model>.brep    the created shape (see `formats`)
+    <model>.status.json            status, error message and timings of the model
+    summary.json                   aggregated result of the whole run
+
+Every model is built in a supervised worker process (see `visualize.isolation`) with a wall-clock
+budget, so a hanging or crashing OCC kernel only fails its own model ("timeout"/"crash" status).
+The status file of a model is written last, so an interrupted run can be resumed by running the same
+command again: models that already have a status file are skipped.
+
+With `--compare_clean`, the models are built once per clean policy (see `CleanPolicy`) into
+`out_dir/clean_<policy>`, and the throughput and valid rate of the policies are compared in
+`out_dir/clean_policies.json`.
+
+Example:
+    python -m visualize.batch Dataset/json_files -o Dataset/build --workers 16 --formats step brep
+    python -m visualize.batch Dataset/json_files -o Dataset/clean_cmp --workers 16 --compare_clean
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from visualize.isolation import DEFAULT_TIMEOUT, IsolatedWorker
+from visualize.macro import CleanPolicy, ValidationLevel
+from visualize.utils.profiler import Profiler
+
+OUTPUT_FORMATS = ("step", "brep")
+
+
+def collect_json_files(inputs) -> list[Path]:
+    """collect JSON files from a directory, a file, or a list of them (sorted, duplicates removed)"""
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = [inputs]
+    files = set()
+    for item in inputs:
+        item = Path(item)
+        if item.is_dir():
+            files.update(item.rglob("*.json"))
+        elif item.suffix == ".json":
+            files.add(item)
+        else:
+            raise ValueError(f"`{item}` is neither a directory nor a JSON file.")
+    return sorted(files)
+
+
+def get_status_path(out_dir: Path, model_id: str) -> Path:
+    return out_dir / f"{model_id}.status.json"
+
+
+def is_finished(out_dir: Path, model_id: str, retry_failed=False) -> bool:
+    status_path = get_status_path(out_dir, model_id)
+    if not status_path.exists():
+        return False
+    if not retry_failed:
+        return True
+    try:
+        with open(status_path, "r", encoding="utf-8") as fp:
+            return json.load(fp)["status"] == "ok"
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def load_statuses(out_dir: Path, json_files: list[Path]) -> list[dict]:
+    """status files of the models of `json_files` in `out_dir`, models without (readable) status are left out"""
+    statuses = []
+    for json_path in json_files:
+        try:
+            with open(get_status_path(out_dir, json_path.stem), "r", encoding="utf-8") as fp:
+                statuses.append(json.load(fp))
+        except (OSError, ValueError):
+            pass
+    return statuses
+
+
+def write_json_atomic(data: dict, path: Path):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=4)
+    os.replace(tmp_path, path)
+
+
+def build_model(json_path, out_dir, formats=("step",), cad_options=None) -> dict:
+    """build a single model and write its shape(s), returns its status (never raises on modeling failures)"""
+    from visualize.sequence import CADSequence
+    from visualize.utils.occ_utils import write_brep, write_step
+
+    json_path, out_dir = Path(json_path), Path(out_dir)
+    model_id = json_path.stem
+    cad_options = cad_options or {}
+    status = {
+        "model_id": model_id,
+        "source": str(json_path),
+        "status": "ok",
+        "error": None,
+        "outputs": [],
+        "timings": {},
+    }
+    t_start = time.perf_counter()
+    try:
+        t = time.perf_counter()
+        with open(json_path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+        cad_seq = CADSequence.from_dict(data, **cad_options)
+        status["timings"]["parse"] = time.perf_counter() - t
+
+        t = time.perf_counter()
+        shape = cad_seq.create_CAD()
+        status["timings"]["build"] = time.perf_counter() - t
+        for timing, seconds in cad_seq.validation_timings.items():
+            status["timings"][f"validate_{timing}"] = seconds
+        if cad_seq.profiler is not None:
+            status["profile"] = cad_seq.profiler.to_json()
+
+        t = time.perf_counter()
+        for fmt in formats:
+            out_path = out_dir / f"{model_id}.{fmt}"
+            if fmt == "step":
+                write_step(shape, out_path)
+            elif fmt == "brep":
+                write_brep(shape, out_path)
+            else:
+                raise ValueError(f"Unknown output format `{fmt}`.")
+            status["outputs"].append(out_path.name)
+        status["timings"]["export"] = time.perf_counter() - t
+    except Exception as e:
+        status["status"] = "error"
+        status["error"] = f"{type(e).__name__}: {e}"
+    status["timings"]["total"] = time.perf_counter() - t_start
+    return status
+
+
+def build_model_isolated(worker: IsolatedWorker, json_path, out_dir, formats=("step",), cad_options=None,
+                         timeout=None) -> dict:
+    """run `build_model` in `worker` and write the status file of the model"""
+    json_path, out_dir = Path(json_path), Path(out_dir)
+    result = worker.run(build_model, json_path, out_dir, formats, cad_options, timeout=timeout)
+    if result["status"] == "ok":
+        status = result["value"]
+    else:
+        status = {
+            "model_id": json_path.stem,
+            "source": str(json_path),
+            "status": result["status"],
+            "error": result["error"],
+            "outputs": [],
+            "timings": {"total": result["elapsed"]},
+        }
+    write_json_atomic(status, get_status_path(out_dir, status["model_id"]))
+    return status
+
+
+def summarize(statuses: list[dict], wall_time: float, workers: int, num_built: int = None) -> dict:
+    """
+    summary of the models of `statuses`, of which `num_built` (default: all) were built in this run of
+    `wall_time` seconds
+    """
+    num_built = len(statuses) if num_built is None else num_built
+    n_ok = sum(1 for s in statuses if s["status"] == "ok")
+    build_times = [s["timings"]["build"] for s in statuses if "build" in s["timings"]]
+    failures = {}
+    profiler = Profiler()
+    for s in statuses:
+        if s["status"] != "ok":
+            failures[s["model_id"]] = s["error"]
+        if "profile" in s:
+            profiler.merge(s["profile"])
+    summary = {
+        "num_models": len(statuses),
+        "num_ok": n_ok,
+        "num_failed": len(statuses) - n_ok,
+        "valid_rate": n_ok / len(statuses) if statuses else 0.0,
+        "num_built": num_built,
+        "workers": workers,
+        "wall_time": wall_time,
+        "models_per_second": num_built / wall_time if wall_time > 0 else 0.0,
+        "total_build_time": sum(build_times),
+        "failures": failures,
+    }
+    if profiler.samples:
+        summary["profile"] = profiler.get_stats()  # stage stats over all models
+    return summary
+
+
+def build_dataset(inputs, out_dir, workers=None, formats=("step",), resume=True, retry_failed=False,
+                  cad_options=None, timeout=DEFAULT_TIMEOUT, verbose=True) -> dict:
+    """
+    Build all JSON models of `inputs` into `out_dir` with `workers` supervised worker processes
+    (default: number of CPUs), each model getting at most `timeout` seconds.
+    Returns the run summary, which is also written to `out_dir/summary.json`.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format `{fmt}`, expected one of {OUTPUT_FORMATS}.")
+
+    json_files = collect_json_files(inputs)
+    if resume:
+        todo = [p for p in json_files if not is_finished(out_dir, p.stem, retry_failed)]
+    else:
+        todo = json_files
+    if verbose:
+        print(f"{len(json_files)} models found, {len(json_files) - len(todo)} already built, {len(todo)} to build.")
+
+    # one supervised worker process per thread, the threads only wait for their worker
+    local = threading.local()
+    all_workers = []
+    lock = threading.Lock()
+
+    def run(json_path):
+        if not hasattr(local, "worker"):
+            local.worker = IsolatedWorker(timeout=timeout)
+            with lock:
+                all_workers.append(local.worker)
+        return build_model_isolated(local.worker, json_path, out_dir, formats, cad_options, timeout)
+
+    statuses = []
+    t_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run, json_path) for json_path in todo]
+            for future in as_completed(futures):
+                statuses.append(future.result())
+                if verbose:
+                    print(f"[{len(statuses)}/{len(todo)}] {statuses[-1]['model_id']}: {statuses[-1]['status']}")
+    finally:
+        for worker in all_workers:
+            worker.close()
+    # the summary covers all models of `inputs`, including the ones built by previous (resumed) runs
+    summary = summarize(load_statuses(out_dir, json_files), time.perf_counter() - t_start, workers, len(statuses))
+    # the build options, to compare the throughput and valid rate of runs with different options
+    summary["cad_options"] = {k: v for k, v in (cad_options or {}).items() if k != "shape_cache"}
+    write_json_atomic(summary, out_dir / "summary.json")
+    if verbose:
+        print(f"Built {summary['num_built']} models in {summary['wall_time']:.1f}s "
+              f"({summary['models_per_second']:.2f} models/s), {summary['num_ok']}/{summary['num_models']} ok.")
+    return summary
+
+
+def compare_clean_policies(inputs, out_dir, policies=None, cad_options=None, verbose=True, **kwargs) -> dict:
+    """
+    Build all JSON models of `inputs` with every clean policy of `policies` (default: all) into
+    `out_dir/clean_<policy>`, see `build_dataset` for the other arguments. Every policy rebuilds all models,
+    so that their summaries are comparable. Returns the throughput and valid rate per policy, which are also
+    written to `out_dir/clean_policies.json`.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    policies = [CleanPolicy(policy) for policy in (policies or CleanPolicy)]
+    kwargs["resume"] = False
+    comparison = {}
+    for policy in policies:
+        options = dict(cad_options or {}, _clean_shape=policy.value)
+        summary = build_dataset(inputs, out_dir / f"clean_{policy.value}", cad_options=options, verbose=verbose,
+                                **kwargs)
+        comparison[policy.value] = {key: summary[key] for key in ("num_models", "num_ok", "valid_rate", "wall_time",
+                                                                  "models_per_second", "total_build_time")}
+    write_json_atomic(comparison, out_dir / "clean_policies.json")
+    if verbose:
+        for policy, result in comparison.items():
+            print(f"{policy:>10}: valid rate {result['valid_rate']:.3f}, {result['models_per_second']:.2f} models/s, "
+                  f"build time {result['total_build_time']:.1f}s")
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build Seek-CAD JSON models in parallel.")
+    parser.add_argument("inputs", nargs="+", help="JSON files or directories containing JSON files")
+    parser.add_argument("-o", "--out_dir", required=True, help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: #CPUs)")
+    parser.add_argument("--formats", nargs="*", default=["step"], choices=OUTPUT_FORMATS,
+                        help="output formats of the created shapes")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="wall-clock budget per model in seconds")
+    parser.add_argument("--no_resume", action="store_true", help="rebuild models that already have a status file")
+    parser.add_argument("--retry_failed", action="store_true", help="rebuild models whose last build failed")
+    parser.add_argument("--no_clean_shape", action="store_true", help="same as `--clean none`")
+    parser.add_argument("--clean", default="per_triple", choices=[policy.value for policy in CleanPolicy],
+                        help="when to heal the shapes: after every triple, once after all booleans, before every "
+                             "refining feature that needs it or never")
+    parser.add_argument("--compare_clean", action="store_true",
+                        help="build with every clean policy and compare their throughput and valid rate")
+    parser.add_argument("--no_validate", action="store_true", help="same as `--validate none`")
+    parser.add_argument("--validate", default="full", choices=[level.value for level in ValidationLevel],
+                        help="checks of the created shapes: none, cheap (null/solids/bbox), final (full checks of "
+                             "the final shape only) or full")
+    parser.add_argument("--strict", action="store_true")
+    parser.add_argument("--entity_tracking", action="store_true",
+                        help="resolve refine references by the modeling history instead of geometric search")
+    parser.add_argument("--no_fuse_runs", action="store_true",
+                        help="apply consecutive ADD/NEW booleans one by one instead of in a single fuse")
+    parser.add_argument("--parallel_booleans", action="store_true", help="run the OCC booleans in parallel mode")
+    parser.add_argument("--fuzzy_value", type=float, default=0.0, help="fuzzy value of the OCC booleans (0: disabled)")
+    parser.add_argument("--use_location", action="store_true",
+                        help="place extrusion/revolution profiles and caps by shape locations instead of copies")
+    parser.add_argument("--profile", action="store_true",
+                        help="record stage timings of every model (status files) and over all models (summary)")
+    parser.add_argument("--cache_dir", default=None, help="directory of the persistent shape cache (disabled if not set)")
+    parser.add_argument("--cache_size", type=float, default=8.0, help="maximum size of the shape cache in GB")
+    args = parser.parse_args()
+
+    cad_options = {
+        "_clean_shape": "none" if args.no_clean_shape else args.clean,
+        "validate": "none" if args.no_validate else args.validate,
+        "strict": args.strict,
+        "debug": False,
+        "entity_tracking": args.entity_tracking,
+        "fuse_runs": not args.no_fuse_runs,
+        "parallel_booleans": args.parallel_booleans,
+        "fuzzy_value": args.fuzzy_value,
+        "use_location": args.use_location,
+        "profile": args.profile,
+    }
+    if args.cache_dir is not None:
+        from visualize.utils.shape_cache import ShapeCache
+        cad_options["shape_cache"] = ShapeCache(args.cache_dir, max_bytes=int(args.cache_size * (1 << 30)))
+    if args.compare_clean:
+        compare_clean_policies(args.inputs, args.out_dir, cad_options=cad_options, workers=args.workers,
+                               formats=args.formats, timeout=args.timeout)
+        return
+    build_dataset(args.inputs, args.out_dir, workers=args.workers, formats=args.formats,
+                  resume=not args.no_resume, retry_failed=args.retry_failed, cad_options=cad_options,
+                  timeout=args.timeout)
+
+
+if __name__ == "__main__":
+    main()
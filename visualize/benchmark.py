@@ -0,0 +1,200 @@
+"""
+Benchmark of the conversion and build pipeline.
+
+Times the pipeline stages (`from_dict`, `numericalize`, `back2json`, `get_code`, `code2json`,
+`to_deepcad_json` and, if OCC is installed, `create_CAD`) over a fixed corpus of JSON models (by default
+`visualize/example/00000066.json`), and over synthetic models which scale one size parameter at a time:
+    curves_per_loop       curves of the (polygonal) sketch loop
+    triples_per_model     stacked SSR triples joined by ADD booleans
+    entities_per_fillet   edges referenced by a fillet
+Every stage is repeated `--repeat` times, the results (count, total, p50, p95, max seconds per stage, see
+`visualize.utils.profiler`) are written as JSON. With `--baseline`, the p50 of every stage is compared
+against a previous result file and the command fails if any stage got slower than `--tolerance`.
+
+Example:
+    python -m visualize.benchmark -o benchmark.json
+    python -m visualize.benchmark -o benchmark_new.json --baseline benchmark.json
+"""
+import argparse
+import importlib.util
+import json
+import platform
+import time
+from pathlib import Path
+
+import numpy as np
+
+from visualize.batch import collect_json_files, write_json_atomic
+from visualize.codify.code2json import code2json
+from visualize.modules.Sketch import LOCAL_FACE_CACHE
+from visualize.sequence import CADSequence
+from visualize.utils.profiler import Profiler
+
+DEFAULT_CORPUS = [Path(__file__).parent / "example" / "00000066.json"]
+
+# sweep name -> keyword argument of `make_synthetic_model` and its values
+SWEEPS = {
+    "curves_per_loop": ("n_curves", [4, 16, 64, 256], {}),
+    "triples_per_model": ("n_triples", [1, 2, 4, 8], {"n_curves": 8}),
+    "entities_per_fillet": ("n_fillet_entities", [1, 4, 16, 32], {"n_curves": 32}),
+}
+
+
+def make_synthetic_model(n_curves=4, n_triples=1, n_fillet_entities=0) -> dict:
+    """
+    JSON model of `n_triples` stacked, overlapping extrusions of a regular polygon with `n_curves` sides,
+    the vertical edges at the first `n_fillet_entities` vertices of the first one are filleted
+    """
+    features, sequence = {}, []
+
+    def add(feature):
+        sequence.append({"index": len(sequence), "type": feature["type"], "name": feature["name"],
+                         "feature_id": feature["id"]})
+        features[feature["id"]] = feature
+
+    angles = 2 * np.pi * np.arange(n_curves) / n_curves
+    points = (0.5 * np.stack([np.cos(angles), np.sin(angles)], axis=1)).round(6).tolist()
+    for t in range(n_triples):
+        point_ids = [f"p{t}_{i}" for i in range(n_curves)]
+        curves = [{"type": "Line2D", "id": f"c{t}_{i}", "start_point": points[i],
+                   "end_point": points[(i + 1) % n_curves], "start_point_id": point_ids[i],
+                   "end_point_id": point_ids[(i + 1) % n_curves]} for i in range(n_curves)]
+        add({"name": f"sketch_{t}", "id": f"sketch_{t}", "type": "sketch",
+             "profiles": {f"profile_{t}": {"loops": [{"loop_curves": curves}]}},
+             "plane": {"origin": [0.0, 0.0, 0.1 * t], "normal": [0.0, 0.0, 1.0], "x": [1.0, 0.0, 0.0]}})
+        add({"name": f"extrude_{t}", "id": f"extrude_{t}", "type": "extrude", "sketch_id": f"sketch_{t}",
+             "parameters": {"bodyType": "SOLID", "operationType": "NEW" if t == 0 else "ADD", "endBound": "BLIND",
+                            "depthOne": 0.15, "depthTwo": 0.0}})
+        if t == 0 and n_fillet_entities > 0:
+            side = float(np.linalg.norm(np.subtract(points[1], points[0])))
+            add({"name": "fillet_0", "id": "fillet_0", "type": "fillet",
+                 "entities": [{"entityType": "EDGE", "capType": "SWEPT", "referenceId": point_ids[i],
+                               "referenceType": "VERTEX"} for i in range(min(n_fillet_entities, n_curves))],
+                 "parameters": {"radius": round(0.1 * side, 6)}})
+    return {"features": features, "sequence": sequence}
+
+
+def is_occ_available() -> bool:
+    return importlib.util.find_spec("OCC") is not None
+
+
+def benchmark_model(json_data, repeat=3, build=True, cad_options=None) -> dict:
+    """stage stats of the pipeline on one model, and the error which stopped it (or None)"""
+    profiler = Profiler()
+    error = None
+    try:
+        for _ in range(repeat):
+            with profiler.stage("from_dict"):
+                seq = CADSequence.from_dict(json_data)
+            seq.normalize(exact_bbox=False)
+            with profiler.stage("numericalize"):
+                seq.numericalize(256)
+            with profiler.stage("back2json"):
+                seq.back2json()
+            with profiler.stage("get_code"):
+                code = seq.get_code()
+            with profiler.stage("code2json"):
+                code2json(code)
+            with profiler.stage("to_deepcad_json"):
+                seq.to_deepcad_json(exact_bbox=False)
+            if build:
+                LOCAL_FACE_CACHE.clear()  # time cold builds
+                seq = CADSequence.from_dict(json_data, **(cad_options or {}))
+                with profiler.stage("create_CAD"):
+                    seq.create_CAD()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"stats": profiler.get_stats(), "error": error}
+
+
+def run_benchmark(inputs=None, repeat=3, build=None, sweeps=True, cad_options=None, verbose=True) -> dict:
+    """
+    Benchmark the JSON models of `inputs` (default: `DEFAULT_CORPUS`) and, if `sweeps`, the synthetic
+    scaling sweeps. `create_CAD` is only timed if `build` (default: if OCC is installed).
+    """
+    build = is_occ_available() if build is None else build
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "build": build,
+            "cad_options": {k: v for k, v in (cad_options or {}).items() if k != "shape_cache"},
+        },
+        "corpus": {},
+        "sweeps": {},
+    }
+    for json_path in collect_json_files(inputs or DEFAULT_CORPUS):
+        with open(json_path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+        results["corpus"][json_path.stem] = benchmark_model(data, repeat, build, cad_options)
+        if verbose:
+            print_case(f"corpus/{json_path.stem}", results["corpus"][json_path.stem])
+    if sweeps:
+        for sweep, (param, values, base) in SWEEPS.items():
+            results["sweeps"][sweep] = {}
+            for value in values:
+                data = make_synthetic_model(**base, **{param: value})
+                results["sweeps"][sweep][str(value)] = benchmark_model(data, repeat, build, cad_options)
+                if verbose:
+                    print_case(f"sweeps/{sweep}/{value}", results["sweeps"][sweep][str(value)])
+    return results
+
+
+def print_case(name, case):
+    stages = ", ".join(f"{stage} {stats['p50'] * 1e3:.2f}ms" for stage, stats in case["stats"].items())
+    print(f"{name}: {stages}" + (f" ({case['error']})" if case["error"] else ""))
+
+
+def flatten_results(results) -> dict[str, float]:
+    """p50 of every stage of every case, keyed by "corpus/<model>/<stage>" or "sweeps/<sweep>/<value>/<stage>" """
+    cases = {f"corpus/{name}": case for name, case in results["corpus"].items()}
+    for sweep, sweep_cases in results["sweeps"].items():
+        cases.update({f"sweeps/{sweep}/{value}": case for value, case in sweep_cases.items()})
+    return {f"{name}/{stage}": stats["p50"] for name, case in cases.items() for stage, stats in case["stats"].items()}
+
+
+def compare_results(results, baseline, tolerance=0.25, min_seconds=1e-3) -> list[dict]:
+    """
+    stages (present in both) whose p50 is more than `tolerance` (relative) and `min_seconds` (absolute)
+    slower than in `baseline`, slowest first
+    """
+    current, previous = flatten_results(results), flatten_results(baseline)
+    regressions = []
+    for key in current.keys() & previous.keys():
+        if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > min_seconds:
+            regressions.append({"stage": key, "baseline": previous[key], "current": current[key],
+                                "ratio": current[key] / previous[key] if previous[key] > 0 else float("inf")})
+    return sorted(regressions, key=lambda r: r["ratio"], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the conversion and build pipeline.")
+    parser.add_argument("inputs", nargs="*", help="JSON files / directories of the corpus (default: the example)")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="result file")
+    parser.add_argument("--baseline", default=None, help="result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown of a stage")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions of every stage")
+    parser.add_argument("--no_build", action="store_true", help="do not time `create_CAD`")
+    parser.add_argument("--no_sweeps", action="store_true", help="skip the synthetic scaling sweeps")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.inputs, repeat=args.repeat, build=False if args.no_build else None,
+                            sweeps=not args.no_sweeps)
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        results["regressions"] = compare_results(results, baseline, args.tolerance)
+    write_json_atomic(results, Path(args.output))
+    if args.baseline is not None:
+        for r in results["regressions"]:
+            print(f"REGRESSION {r['stage']}: {r['baseline'] * 1e3:.2f}ms -> {r['current'] * 1e3:.2f}ms "
+                  f"(x{r['ratio']:.2f})")
+        if results["regressions"]:
+            raise SystemExit(1)
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Crash- and hang-isolated execution of OCC builds.
+
+OCC kernels (fillet, chamfer, thick solid, booleans) can hang for minutes or crash the interpreter on
+bad inputs. `IsolatedWorker` runs tasks in a supervised child process with a wall-clock budget: a stuck
+worker is killed and a crashed one is replaced, and both are reported as a structured result
+instead of stalling or killing the caller.
+
+Every task returns a result dict:
+    {
+        "status": "ok" | "error" | "timeout" | "crash",
+        "value": <return value of the task, or None>,
+        "error": <error message, or None>,
+        "elapsed": <wall-clock seconds>,
+    }
+
+The workers are started with "spawn" by default: they are often created from threads (e.g. by
+`visualize.batch`), and forking a multi-threaded process can deadlock the child on a lock held by another thread.
+"""
+import multiprocessing
+import time
+
+DEFAULT_TIMEOUT = 120.0  # wall-clock budget of a task in seconds
+DEFAULT_START_METHOD = "spawn"
+
+
+def _worker_loop(conn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        fn, args, kwargs = task
+        try:
+            msg = ("ok", fn(*args, **kwargs), None)
+        except Exception as e:
+            msg = ("error", None, f"{type(e).__name__}: {e}")
+        try:
+            conn.send(msg)
+        except Exception as e:
+            conn.send(("error", None, f"Failed to send result: {type(e).__name__}: {e}"))
+    conn.close()
+
+
+class IsolatedWorker(object):
+    """
+    A supervised worker process. `run()` executes a picklable function in the worker and waits at most
+    `timeout` seconds for it. The worker is started lazily, killed on timeout, restarted after a
+    crash or a timeout, and recycled after `max_tasks` tasks to give back memory leaked by OCC.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_tasks=256, mp_context=None):
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.mp_context = mp_context or multiprocessing.get_context(DEFAULT_START_METHOD)
+        self.process = None
+        self.conn = None
+        self.num_tasks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        parent_conn, child_conn = self.mp_context.Pipe()
+        self.process = self.mp_context.Process(target=_worker_loop, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.num_tasks = 0
+
+    def kill(self):
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join()
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+    def close(self):
+        if self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=5)
+            except (OSError, ValueError):
+                pass
+        self.kill()
+
+    def run(self, fn, *args, timeout=None, **kwargs) -> dict:
+        timeout = self.timeout if timeout is None else timeout
+        if self.process is None or not self.process.is_alive() or self.num_tasks >= self.max_tasks:
+            self.kill()
+            self.start()
+        self.num_tasks += 1
+
+        t_start = time.perf_counter()
+        result = {"status": "ok", "value": None, "error": None, "elapsed": 0.0}
+        try:
+            self.conn.send((fn, args, kwargs))
+            if not self.conn.poll(timeout):
+                result["status"] = "timeout"
+                result["error"] = f"Task did not finish within {timeout}s."
+                self.kill()
+            else:
+                result["status"], result["value"], result["error"] = self.conn.recv()
+        except (EOFError, OSError):
+            # the worker died while running the task (e.g. a segfault inside OCC)
+            self.process.join()
+            result["status"] = "crash"
+            result["error"] = f"Worker crashed with exit code {self.process.exitcode}."
+            self.kill()
+        result["elapsed"] = time.perf_counter() - t_start
+        return result
+
+
+def _build_to_brep(json_data, cad_options, handle):
+    from visualize.sequence import CADSequence
+    from visualize.utils.shape_transport import send_shape
+
+    shape = CADSequence.from_dict(json_data, **cad_options).create_CAD()
+    return send_shape(shape, handle)  # the filled handle, the receiver's copy is still empty
+
+
+def build_shape_isolated(json_data, cad_options=None, timeout=DEFAULT_TIMEOUT, worker: IsolatedWorker = None) -> dict:
+    """
+    Build `json_data` with `CADSequence.from_dict(json_data, **cad_options).create_CAD()` in a supervised
+    worker. On success, the result's "value" is the created TopoDS_Shape.
+    """
+    from visualize.utils.shape_transport import new_handle, receive_shape, release_shape
+
+    cad_options = cad_options or {}
+    handle = new_handle()  # the shape comes back through shared memory, see `visualize.utils.shape_transport`
+    own_worker = worker is None
+    if own_worker:
+        worker = IsolatedWorker(timeout=timeout)
+    try:
+        result = worker.run(_build_to_brep, json_data, cad_options, handle, timeout=timeout)
+        if result["status"] == "ok":
+            result["value"] = receive_shape(result["value"])
+    finally:
+        if own_worker:
+            worker.close()
+        release_shape(handle)
+    return result
@@ -20,3 +20,17 @@ class CapType(Enum):
     START = "START"
     END = "END"
     SWEPT = "SWEPT"
+
+
+class CleanPolicy(Enum):
+    PER_TRIPLE = "per_triple"  # clean every local shape
+    FINAL = "final"  # clean the final shape once, after all booleans
+    ON_DEMAND = "on_demand"  # clean the shape before each refining feature only
+    NONE = "none"
+
+
+class ValidationLevel(Enum):
+    NONE = "none"  # no checks
+    CHEAP = "cheap"  # null shape / solid count / bbox volume of every shape
+    FINAL = "final"  # cheap checks of the local shapes, full checks of the final shape
+    FULL = "full"  # BRepCheck_Analyzer of every shape, volume of the final shape
@@ -1,21 +1,16 @@
+from __future__ import annotations
+
 import copy
 import uuid
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 
 import numpy as np
-from OCC.Core.BRep import BRep_Tool
-from OCC.Core.Geom import Geom_BSplineCurve
-from OCC.Core.GeomAPI import GeomAPI_Interpolate
-from OCC.Core.TColStd import TColStd_Array1OfReal, TColStd_Array1OfInteger
-from OCC.Core.TopoDS import TopoDS_Edge
-from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Circ, gp_Ax2
-from OCC.Core.BRepBuilderAPI import (BRepBuilderAPI_MakeEdge,
-                                     BRepBuilderAPI_MakeVertex)
-from OCC.Core.BRepAdaptor import BRepAdaptor_Curve
-from OCC.Core.GC import GC_MakeArcOfCircle
-from OCC.Core.TColgp import TColgp_Array1OfPnt, TColgp_HArray1OfPnt
-from visualize.utils.occ_utils import get_bbox
 from visualize.macro import DUMMY_PLANE
+from visualize.utils.math_utils import circumcircle_2d, arc_sweep, arc_extreme_angles, sample_interpolated_spline
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Edge
 
 
 # --------------------------------------------------
@@ -28,13 +23,30 @@ class CurveBase(ABC):
 
     def __init__(self, topo_ds_edge, curve_id, start_point_id=None, end_point_id=None,
                  start_point=None, end_point=None):
-        self.topo_ds_edge_from_2d_coord = topo_ds_edge
+        self._topo_ds_edge = topo_ds_edge
         self.id = curve_id
         self.start_point_id = start_point_id
         self.end_point_id = end_point_id
         self.start_point = start_point
         self.end_point = end_point
 
+    @property
+    def topo_ds_edge_from_2d_coord(self) -> TopoDS_Edge:
+        """OCC edge of the curve in local coordinates, built on first use"""
+        if self._topo_ds_edge is None:
+            self._topo_ds_edge = self.create_curve_3D(DUMMY_PLANE)
+        return self._topo_ds_edge
+
+    def drop_topo_ds(self):
+        """release the OCC edge, it is rebuilt if needed again"""
+        self._topo_ds_edge = None
+
+    def __getstate__(self):
+        # OCC handles are not picklable, the edge is rebuilt lazily after unpickling
+        state = self.__dict__.copy()
+        state["_topo_ds_edge"] = None
+        return state
+
     @abstractmethod
     def create_curve_3D(self, plane):
         pass
@@ -63,10 +75,16 @@ class CurveBase(ABC):
         """construct curve from json data"""
         raise NotImplementedError
 
+    @abstractmethod
+    def get_extreme_points(self, plane=None) -> np.ndarray:
+        """points of the curve which bound it, in global coordinates of `plane` (local coordinates if None)"""
+        pass
+
     @property
     def bbox(self):
-        """compute bounding box of the curve"""
-        return get_bbox(self.topo_ds_edge_from_2d_coord)
+        """compute bounding box of the curve (in local coordinates)"""
+        points = self.get_extreme_points()
+        return np.stack([np.min(points, axis=0), np.max(points, axis=0)], axis=0)
 
     def reverse(self):
         """reverse the curve direction"""
@@ -85,6 +103,31 @@ class CurveBase(ABC):
         g_point = g_point.tolist()
         return g_point
 
+    @staticmethod
+    def get_frame(plane=None):
+        """origin, x axis and y axis of `plane` (the local XY frame if None)"""
+        if plane is None:
+            return np.zeros(3), np.array([1.0, 0.0, 0.0]), np.array([0.0, 1.0, 0.0])
+        x_axis = np.array(plane["x"], dtype=float)
+        return np.array(plane["origin"], dtype=float), x_axis, np.cross(plane["normal"], x_axis)
+
+    @staticmethod
+    def get_location(plane):
+        """TopLoc_Location which places shapes built in the local XY frame onto `plane`"""
+        from OCC.Core.TopLoc import TopLoc_Location
+        from OCC.Core.gp import gp_Ax3, gp_Dir, gp_Pnt, gp_Trsf
+        trsf = gp_Trsf()
+        trsf.SetTransformation(gp_Ax3(gp_Pnt(*plane["origin"]), gp_Dir(*plane["normal"]), gp_Dir(*plane["x"])),
+                               gp_Ax3())
+        return TopLoc_Location(trsf)
+
+    @staticmethod
+    def local2global_array(points, plane=None) -> np.ndarray:
+        """vectorized `local2global` of (N, 2+) local points"""
+        points = np.asarray(points, dtype=float)
+        origin, x_axis, y_axis = CurveBase.get_frame(plane)
+        return points[:, :1] * x_axis + points[:, 1:2] * y_axis + origin
+
     @staticmethod
     def construct_curve_from_dict(curve):
         if curve["type"] == "Line2D":
@@ -100,6 +143,8 @@ class CurveBase(ABC):
 
     @staticmethod
     def create_line(start_point, end_point):
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+        from OCC.Core.gp import gp_Pnt
         start_point = gp_Pnt(*start_point)
         end_point = gp_Pnt(*end_point)
         topo_edge = BRepBuilderAPI_MakeEdge(start_point, end_point)
@@ -107,6 +152,9 @@ class CurveBase(ABC):
 
     @staticmethod
     def create_arc(start_point, end_point, midpoint):
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+        from OCC.Core.GC import GC_MakeArcOfCircle
+        from OCC.Core.gp import gp_Pnt
         start_point = gp_Pnt(*start_point)
         end_point = gp_Pnt(*end_point)
         mid_point = gp_Pnt(*midpoint)
@@ -117,6 +165,8 @@ class CurveBase(ABC):
 
     @staticmethod
     def create_circle(center, plane, radius):
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+        from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Circ, gp_Ax2
         center = gp_Pnt(*center)
         axis = gp_Dir(*plane["normal"])
         gp_circle = gp_Circ(gp_Ax2(center, axis), abs(float(radius)))
@@ -125,6 +175,11 @@ class CurveBase(ABC):
 
     @staticmethod
     def create_bspline(control_points, knots, degree, is_periodic):
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+        from OCC.Core.Geom import Geom_BSplineCurve
+        from OCC.Core.TColStd import TColStd_Array1OfReal, TColStd_Array1OfInteger
+        from OCC.Core.TColgp import TColgp_Array1OfPnt
+        from OCC.Core.gp import gp_Pnt
         global_control_points = [gp_Pnt(*p) for p in control_points]
         oc_control_points = TColgp_Array1OfPnt(1, len(global_control_points))
         for i, p in enumerate(global_control_points):
@@ -149,6 +204,8 @@ class CurveBase(ABC):
 
     @staticmethod
     def get_bspline_interpolated_points(bspline_edge: TopoDS_Edge, knots: list[float]):
+        from OCC.Core.BRep import BRep_Tool
+        from OCC.Core.gp import gp_Pnt
         curve_handle, first_param, last_param = BRep_Tool.Curve(bspline_edge)
         _interpolated_points = []
         for knot in knots:
@@ -169,6 +226,10 @@ class CurveBase(ABC):
 
     @staticmethod
     def create_interpolate_spline(points):
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+        from OCC.Core.GeomAPI import GeomAPI_Interpolate
+        from OCC.Core.TColgp import TColgp_HArray1OfPnt
+        from OCC.Core.gp import gp_Pnt
         array = TColgp_HArray1OfPnt(1, len(points))
         for i, p in enumerate(points):
             array.SetValue(i + 1, gp_Pnt(*p))
@@ -177,9 +238,12 @@ class CurveBase(ABC):
         curve = interpolator.Curve()
         return BRepBuilderAPI_MakeEdge(curve).Edge()
 
-    def find_topo_ds_by_id(self, the_id, plane):
+    def find_topo_ds_by_id(self, the_id, plane, location=None):
+        """edge / vertex of an ID on `plane`, the local topology is placed by `location` (see `get_location`)"""
+        from OCC.Core.TopoDS import topods
+        location = CurveBase.get_location(plane) if location is None else location
         if self.id == the_id:
-            return self.create_curve_3D(plane)
+            return topods.Edge(self.topo_ds_edge_from_2d_coord.Moved(location))
         if self.start_point is not None:
             if the_id == self.start_point_id:
                 p = self.start_point
@@ -187,15 +251,16 @@ class CurveBase(ABC):
                 p = self.end_point
             else:
                 return None
-            g_p = CurveBase.local2global(p, plane)
-            return BRepBuilderAPI_MakeVertex(gp_Pnt(*g_p)).Vertex()
+            from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeVertex
+            from OCC.Core.gp import gp_Pnt
+            vertex = BRepBuilderAPI_MakeVertex(gp_Pnt(float(p[0]), float(p[1]), 0.0)).Vertex()
+            return topods.Vertex(vertex.Moved(location))
         return None
 
 
 class Line(CurveBase):
     def __init__(self, start_point, end_point, start_point_id, end_point_id, curve_id):
-        curve_topo_ds = CurveBase.create_line(start_point, end_point)
-        super(Line, self).__init__(curve_topo_ds, curve_id, start_point_id, end_point_id, start_point, end_point)
+        super(Line, self).__init__(None, curve_id, start_point_id, end_point_id, start_point, end_point)
 
     def __str__(self):
         return f"Line({self.start_point}, {self.end_point})"
@@ -239,7 +304,11 @@ class Line(CurveBase):
         return CurveBase.create_line(CurveBase.local2global(self.start_point, plane),
                                      CurveBase.local2global(self.end_point, plane))
 
+    def get_extreme_points(self, plane=None) -> np.ndarray:
+        return CurveBase.local2global_array([self.start_point, self.end_point], plane)
+
     def transform_param(self, translate, scale, numericalize=False):
+        self.drop_topo_ds()
         self.start_point = (self.start_point + translate) * scale
         self.end_point = (self.end_point + translate) * scale
         if numericalize:
@@ -247,6 +316,7 @@ class Line(CurveBase):
             self.end_point = self.end_point.round()
 
     def numericalize(self, n=256):
+        self.drop_topo_ds()
         self.start_point = (self.start_point * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
         self.end_point = (self.end_point * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
 
@@ -267,8 +337,7 @@ class Arc(CurveBase):
         self.end_angle = end_angle
         self.midpoint = mid_point
         self.ref_vec = ref_vec
-        curve_topo_ds = CurveBase.create_arc(start_point, end_point, mid_point)
-        super(Arc, self).__init__(curve_topo_ds, curve_id, start_point_id, end_point_id, start_point, end_point)
+        super(Arc, self).__init__(None, curve_id, start_point_id, end_point_id, start_point, end_point)
         self.degrees = self.get_degrees()
 
     # @property
@@ -277,9 +346,13 @@ class Arc(CurveBase):
     #     return np.rad2deg(sweep_angle)
 
     def get_degrees(self):
-        the_edge = self.topo_ds_edge_from_2d_coord
-        curve = BRepAdaptor_Curve(the_edge)
-        sweep_angle = max(abs(curve.LastParameter() - curve.FirstParameter()), 1)
+        circle = circumcircle_2d(self.start_point, self.midpoint, self.end_point)
+        sweep_angle = 0.0
+        if circle is not None:
+            center, _ = circle
+            _, sweep_angle = arc_sweep(*[np.arctan2(p[1] - center[1], p[0] - center[0])
+                                         for p in [self.start_point, self.midpoint, self.end_point]])
+        sweep_angle = max(abs(sweep_angle), 1)
         return np.rad2deg(sweep_angle)
 
     @property
@@ -318,7 +391,20 @@ class Arc(CurveBase):
                                     CurveBase.local2global(self.end_point, plane),
                                     CurveBase.local2global(self.midpoint, plane))
 
+    def get_extreme_points(self, plane=None) -> np.ndarray:
+        circle = circumcircle_2d(self.start_point, self.midpoint, self.end_point)
+        if circle is None:  # degenerated arc
+            return CurveBase.local2global_array([self.start_point, self.midpoint, self.end_point], plane)
+        center, radius = circle
+        start_angle, mid_angle, end_angle = [np.arctan2(p[1] - center[1], p[0] - center[0])
+                                             for p in [self.start_point, self.midpoint, self.end_point]]
+        _, x_axis, y_axis = CurveBase.get_frame(plane)
+        angles = arc_extreme_angles(start_angle, mid_angle, end_angle, x_axis, y_axis)
+        points = center + radius * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        return CurveBase.local2global_array(points, plane)
+
     def transform_param(self, translate, scale, numericalize=False):
+        self.drop_topo_ds()
         self.start_point = (self.start_point + translate) * scale
         self.midpoint = (self.midpoint + translate) * scale
         self.end_point = (self.end_point + translate) * scale
@@ -333,6 +419,7 @@ class Arc(CurveBase):
             self.radius = round(self.radius)
 
     def numericalize(self, n=256):
+        self.drop_topo_ds()
         # print(f"before: start_point: {self.start_point}, midpoint:{self.midpoint}, end_point: {self.end_point}")
         self.start_point = (self.start_point * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
         self.midpoint = (self.midpoint * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
@@ -424,13 +511,19 @@ class Circle(CurveBase):
     def __init__(self, center, radius, curve_id):
         self.center = center
         self.radius = radius
-        curve_topo_ds = CurveBase.create_circle(center, DUMMY_PLANE, radius)
-        super(Circle, self).__init__(curve_topo_ds, curve_id)
+        super(Circle, self).__init__(None, curve_id)
 
     def create_curve_3D(self, plane):
         return CurveBase.create_circle(CurveBase.local2global(self.center, plane), plane, self.radius)
 
+    def get_extreme_points(self, plane=None) -> np.ndarray:
+        center = CurveBase.local2global_array([self.center], plane)[0]
+        _, x_axis, y_axis = CurveBase.get_frame(plane)
+        extent = abs(float(self.radius)) * np.sqrt(x_axis ** 2 + y_axis ** 2)
+        return np.stack([center - extent, center + extent], axis=0)
+
     def transform_param(self, translate, scale, numericalize=False):
+        self.drop_topo_ds()
         self.center = (self.center + translate) * scale
         self.radius = abs(self.radius * scale)
         if numericalize:
@@ -438,6 +531,7 @@ class Circle(CurveBase):
             self.radius = round(self.radius)
 
     def numericalize(self, n=256):
+        self.drop_topo_ds()
         self.center = (self.center * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
         self.radius = int((self.radius * (n / 2)).round().clip(min=0, max=n))
 
@@ -488,9 +582,7 @@ class BSpline(CurveBase):
                  interpolated_points):
         self.is_periodic = is_periodic
         self.interpolated_points = interpolated_points
-        curve_topo_ds = CurveBase.create_interpolate_spline(interpolated_points)
-        super(BSpline, self).__init__(curve_topo_ds, curve_id, start_point_id, end_point_id, start_point,
-                                      end_point)
+        super(BSpline, self).__init__(None, curve_id, start_point_id, end_point_id, start_point, end_point)
 
     def create_curve_3D(self, plane):
         global_interpolated_points = []
@@ -499,7 +591,12 @@ class BSpline(CurveBase):
             global_interpolated_points.append(g_p)
         return CurveBase.create_interpolate_spline(global_interpolated_points)
 
+    def get_extreme_points(self, plane=None) -> np.ndarray:
+        points = sample_interpolated_spline(np.array(self.interpolated_points, dtype=float)[:, :2])
+        return CurveBase.local2global_array(points, plane)
+
     def transform_param(self, translate, scale, numericalize=False):
+        self.drop_topo_ds()
         self.start_point = (self.start_point + translate) * scale
         self.end_point = (self.end_point + translate) * scale
         new_interpolated_points = []
@@ -517,6 +614,7 @@ class BSpline(CurveBase):
             self.interpolated_points = new_interpolated_points
 
     def numericalize(self, n=256):
+        self.drop_topo_ds()
         self.start_point = (self.start_point * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
         self.end_point = (self.end_point * (n / 2)).round().clip(min=-n / 2, max=n / 2).astype(int)
         numericalized_interpolated_points = []
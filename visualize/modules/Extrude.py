@@ -1,59 +1,92 @@
+from __future__ import annotations
+
 import uuid
+from typing import TYPE_CHECKING
 
 import numpy as np
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
-from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakePrism
-from OCC.Core.TopoDS import TopoDS_Shape
-from OCC.Core.gp import gp_Trsf, gp_Vec, gp_Dir
 
 from visualize.macro import CapType
 from visualize.base.SketchBasedVFeature import SketchBasedVFeature
 from visualize.modules.Sketch import Sketch
+from visualize.utils.profiler import profile_stage
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+    from visualize.utils.entity_tracker import EntityTracker
+    from visualize.utils.profiler import Profiler
 
 
 class Extrude(SketchBasedVFeature):
-    def __init__(self, feat_name, feat_id, feat_type, parameters):
-        super().__init__(feat_name, feat_id, feat_type, parameters)
+    def __init__(self, feat_name, feat_id, feat_type, parameters, use_location=False):
+        super().__init__(feat_name, feat_id, feat_type, parameters, use_location)
         self.depth_one = self.parameters['depthOne']
         self.depth_two = self.parameters['depthTwo']
         assert self.depth_one != 0 or self.depth_two != 0, "Extrude depth_one and depth_two cannot both be zero."
 
     @staticmethod
-    def from_dict(feature):
+    def from_dict(feature, use_location=False):
         return Extrude(feature["name"],
                        feature["id"],
                        feature["type"],
-                       feature["parameters"])
+                       feature["parameters"], use_location)
 
     def __get_gp_dir_one(self, ext_normal):
+        from OCC.Core.gp import gp_Vec, gp_Dir
         if self.depth_one != 0:
             return gp_Vec(gp_Dir(*ext_normal)).Multiplied(self.depth_one)
         return None
 
     def __get_gp_dir_two(self, ext_normal):
+        from OCC.Core.gp import gp_Vec, gp_Dir
         if self.depth_two != 0:
             return gp_Vec(gp_Dir(*ext_normal).Reversed()).Multiplied(self.depth_two)
         return None
 
-    def _op(self, s: TopoDS_Shape, normal: list[float]):
+    def _op(self, s: TopoDS_Shape, normal: list[float], tracker: EntityTracker = None):
+        from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakePrism
+        from OCC.Core.gp import gp_Trsf, gp_Vec, gp_Dir
         ext_normal = np.array(normal)
         ext_normal = ext_normal / np.linalg.norm(ext_normal)
 
+        base, translator = s, None
         if self.depth_one != 0 and self.depth_two != 0:
             trans = gp_Trsf()
             trans.SetTranslation(gp_Vec(*(ext_normal * -1 * self.depth_two)))
-            translator = BRepBuilderAPI_Transform(s, trans)
-            s = translator.Shape()
+            s, translator = self.place(s, trans)
             ext_dir = gp_Vec(gp_Dir(*ext_normal)).Multiplied(abs(self.depth_two) + abs(self.depth_one))
-            return BRepPrimAPI_MakePrism(s, ext_dir).Shape()
-        ext_dir = self.__get_gp_dir_one(ext_normal) if self.depth_one != 0 else self.__get_gp_dir_two(ext_normal)
-        return BRepPrimAPI_MakePrism(s, ext_dir).Shape()
+        else:
+            ext_dir = self.__get_gp_dir_one(ext_normal) if self.depth_one != 0 else self.__get_gp_dir_two(ext_normal)
+        prism = BRepPrimAPI_MakePrism(s, ext_dir)
+        if tracker is not None:
+            tracker.record_sweep(base, prism, translator, self.get_cap_sides())
+        return prism.Shape()
+
+    def op(self, sketch: Sketch, tracker: EntityTracker = None, profiler: Profiler = None) -> TopoDS_Shape:
+        with profile_stage(profiler, "sketch"):
+            s = sketch.create_sketch(return_union=True)
+        with profile_stage(profiler, "extrude"):
+            return self._op(s, sketch.plane["normal"], tracker)
+
+    def get_sweep_range(self) -> tuple[float, float]:
+        if self.depth_one != 0 and self.depth_two != 0:
+            return -self.depth_two, -self.depth_two + abs(self.depth_one) + abs(self.depth_two)
+        elif self.depth_one != 0:
+            return 0.0, self.depth_one
+        return 0.0, -self.depth_two
+
+    def get_cap_positions(self) -> dict[CapType, float]:
+        return {CapType.START: -self.depth_two, CapType.END: self.depth_one}
 
-    def op(self, sketch: Sketch) -> TopoDS_Shape:
-        s = sketch.create_sketch(return_union=True)
-        return self._op(s, sketch.plane["normal"])
+    def estimate_bbox(self, sketch: Sketch) -> np.ndarray:
+        ext_normal = np.array(sketch.plane["normal"])
+        ext_normal = ext_normal / np.linalg.norm(ext_normal)
+        offsets = self.get_sweep_range()
+        corners = sketch.get_bbox_corners()
+        points = np.concatenate([corners + ext_normal * offset for offset in offsets], axis=0)
+        return np.stack([np.min(points, axis=0), np.max(points, axis=0)], axis=0)
 
     def transform(self, s: TopoDS_Shape, cap_type: CapType, param=None) -> TopoDS_Shape:
+        from OCC.Core.gp import gp_Trsf, gp_Vec
         ext_normal = np.array(param.get("normal", [0.0, 0.0, 1.0]))
         ext_normal = ext_normal / np.linalg.norm(ext_normal)
         trans = gp_Trsf()
@@ -66,8 +99,7 @@ class Extrude(SketchBasedVFeature):
             if self.depth_one == 0:
                 return s
             trans.SetTranslation(gp_Vec(*(ext_normal * self.depth_one)))
-        translator = BRepBuilderAPI_Transform(s, trans)
-        return translator.Shape()
+        return self.place(s, trans)[0]
 
     def transform_param(self, translation, scale):
         self.depth_one *= scale
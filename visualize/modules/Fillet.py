@@ -1,7 +1,14 @@
-from OCC.Core.BRepFilletAPI import BRepFilletAPI_MakeFillet
-from OCC.Core.TopoDS import TopoDS_Shape
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from visualize.base.RefiningVFeature import RefiningVFeature
+from visualize.utils.profiler import profile_stage
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+    from visualize.utils.entity_tracker import EntityTracker
+    from visualize.utils.profiler import Profiler
 
 
 class Fillet(RefiningVFeature):
@@ -17,7 +24,9 @@ class Fillet(RefiningVFeature):
                       feature["entities"],
                       feature["parameters"], strict, debug)
 
-    def _op(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]]) -> TopoDS_Shape:
+    def _op(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]], tracker: EntityTracker = None,
+            profiler: Profiler = None) -> TopoDS_Shape:
+        from OCC.Core.BRepFilletAPI import BRepFilletAPI_MakeFillet
         # =====================================================================
         if self.debug:
             from OCC.Display.SimpleGui import init_display
@@ -25,10 +34,7 @@ class Fillet(RefiningVFeature):
             from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
             display.DisplayShape(s, color=Quantity_Color(0, 0, 0, Quantity_TOC_RGB), transparency=0.5, update=True)
             cnt = 0
-            for edge in self.locate_edges(s, entities["edges"], self.strict):
-                display.DisplayShape(edge, color=Quantity_Color(1, 0, 0, Quantity_TOC_RGB), update=True)
-                cnt += 1
-            for edge in self.locate_edges_from_faces(s, entities["faces"], self.strict):
+            for edge in self.get_target_edges(s, entities):
                 display.DisplayShape(edge, color=Quantity_Color(1, 0, 0, Quantity_TOC_RGB), update=True)
                 cnt += 1
             print("=====================================================================")
@@ -37,12 +43,16 @@ class Fillet(RefiningVFeature):
             start_display()
         # =====================================================================
 
-        fillet = BRepFilletAPI_MakeFillet(s)
-        for edge in self.locate_edges(s, entities["edges"], self.strict):
-            fillet.Add(self.radius, edge)
-        for edge in self.locate_edges_from_faces(s, entities["faces"], self.strict):
-            fillet.Add(self.radius, edge)
-        return fillet.Shape()
+        with profile_stage(profiler, "locate_edges"):
+            edges = self.get_target_edges(s, entities)
+        with profile_stage(profiler, "fillet"):
+            fillet = BRepFilletAPI_MakeFillet(s)
+            for edge in edges:
+                fillet.Add(self.radius, edge)
+            s = fillet.Shape()
+        if tracker is not None:
+            tracker.record(fillet)
+        return s
 
     def transform_param(self, translation, scale):
         self.radius *= scale
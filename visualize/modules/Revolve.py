@@ -1,52 +1,89 @@
+from __future__ import annotations
+
 import math
+from typing import TYPE_CHECKING
+
 from visualize.modules import Sketch
 import numpy as np
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
-from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeRevol
-from OCC.Core.TopoDS import TopoDS_Shape
-from OCC.Core.gp import gp_Ax1, gp_Trsf, gp_Pnt, gp_Dir
 
 from visualize.utils.math_utils import numericalize_unit_vector, denumericalize_unit_vector, fmt_list, format_offset
 from visualize.base.SketchBasedVFeature import SketchBasedVFeature
 from visualize.macro import CapType
+from visualize.utils.profiler import profile_stage
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+    from visualize.utils.entity_tracker import EntityTracker
+    from visualize.utils.profiler import Profiler
 
 
 class Revolve(SketchBasedVFeature):
-    def __init__(self, feat_name, feat_id, feat_type, parameters):
-        super().__init__(feat_name, feat_id, feat_type, parameters)
+    def __init__(self, feat_name, feat_id, feat_type, parameters, use_location=False):
+        super().__init__(feat_name, feat_id, feat_type, parameters, use_location)
         self.axis = self.parameters['axis']
         self.angle_one = self.parameters['angleOne']
         self.angle_two = self.parameters['angleTwo']
 
     @staticmethod
-    def from_dict(feature):
+    def from_dict(feature, use_location=False):
         return Revolve(feature["name"],
                        feature["id"],
                        feature["type"],
-                       feature["parameters"])
+                       feature["parameters"], use_location)
 
-    def _op(self, s: TopoDS_Shape) -> TopoDS_Shape:
+    def _op(self, s: TopoDS_Shape, tracker: EntityTracker = None) -> TopoDS_Shape:
+        from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakeRevol
+        from OCC.Core.gp import gp_Ax1, gp_Trsf, gp_Pnt, gp_Dir
         # ======= denormalize direction ========
         direction = denumericalize_unit_vector(self.axis["direction"])
         # ==================================
         axis = gp_Ax1(gp_Pnt(*self.axis["point"]), gp_Dir(*direction))
+        base, transform = s, None
         if self.angle_one != 0 and self.angle_two != 0:
             trans = gp_Trsf()
             trans.SetRotation(axis, -1 * math.radians(self.angle_two))
-            transform = BRepBuilderAPI_Transform(s, trans)
-            s = transform.Shape()
-            return BRepPrimAPI_MakeRevol(s,
-                                         axis,
-                                         math.radians(abs(self.angle_one) + abs(self.angle_two))
-                                         ).Shape()
-        angle = self.angle_one if self.angle_one != 0 else (-1 * self.angle_two)
-        return BRepPrimAPI_MakeRevol(s, axis, math.radians(angle)).Shape()
-
-    def op(self, sketch: Sketch) -> TopoDS_Shape:
-        s = sketch.create_sketch(return_union=True)
-        return self._op(s)
+            s, transform = self.place(s, trans)
+            revol = BRepPrimAPI_MakeRevol(s,
+                                          axis,
+                                          math.radians(abs(self.angle_one) + abs(self.angle_two))
+                                          )
+        else:
+            angle = self.angle_one if self.angle_one != 0 else (-1 * self.angle_two)
+            revol = BRepPrimAPI_MakeRevol(s, axis, math.radians(angle))
+        if tracker is not None:
+            tracker.record_sweep(base, revol, transform, self.get_cap_sides())
+        return revol.Shape()
+
+    def op(self, sketch: Sketch, tracker: EntityTracker = None, profiler: Profiler = None) -> TopoDS_Shape:
+        with profile_stage(profiler, "sketch"):
+            s = sketch.create_sketch(return_union=True)
+        with profile_stage(profiler, "revolve"):
+            return self._op(s, tracker)
+
+    def get_sweep_range(self) -> tuple[float, float]:
+        if self.angle_one != 0 and self.angle_two != 0:
+            return -self.angle_two, -self.angle_two + abs(self.angle_one) + abs(self.angle_two)
+        elif self.angle_one != 0:
+            return 0.0, self.angle_one
+        return 0.0, -self.angle_two
+
+    def get_cap_positions(self) -> dict[CapType, float]:
+        return {CapType.START: -self.angle_two, CapType.END: self.angle_one}
+
+    def estimate_bbox(self, sketch: Sketch) -> np.ndarray:
+        # each corner sweeps (at most) a full circle around the axis, whose box is center ± r * sqrt(1 - a_k^2)
+        direction = denumericalize_unit_vector(self.axis["direction"], return_np=True)
+        point = np.array(self.axis["point"], dtype=float)
+        corners = sketch.get_bbox_corners()
+        t = (corners - point) @ direction
+        centers = point + t[:, None] * direction
+        radii = np.linalg.norm(corners - centers, axis=1)
+        extent = radii[:, None] * np.sqrt(np.clip(1 - direction ** 2, 0, 1))
+        points = np.concatenate([corners, centers - extent, centers + extent], axis=0)
+        return np.stack([np.min(points, axis=0), np.max(points, axis=0)], axis=0)
 
     def transform(self, s: TopoDS_Shape, cap_type: CapType, param=None) -> TopoDS_Shape:
+        from OCC.Core.gp import gp_Ax1, gp_Trsf, gp_Pnt, gp_Dir
         # ======= denormalize direction ========
         direction = denumericalize_unit_vector(self.axis["direction"])
         # ==================================
@@ -61,8 +98,7 @@ class Revolve(SketchBasedVFeature):
             if self.angle_one == 0:
                 return s
             trans.SetRotation(axis, math.radians(self.angle_one))
-        translator = BRepBuilderAPI_Transform(s, trans)
-        return translator.Shape()
+        return self.place(s, trans)[0]
 
     def transform_param(self, translation, scale):
         self.axis["point"] = (np.array(self.axis["point"]) + translation) * scale
@@ -1,8 +1,14 @@
-from OCC.Core.BRepOffsetAPI import BRepOffsetAPI_MakeThickSolid
-from OCC.Core.TopTools import TopTools_ListOfShape
-from OCC.Core.TopoDS import TopoDS_Shape
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from visualize.base.RefiningVFeature import RefiningVFeature
+from visualize.utils.profiler import profile_stage
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+    from visualize.utils.entity_tracker import EntityTracker
+    from visualize.utils.profiler import Profiler
 
 
 class Shell(RefiningVFeature):
@@ -18,10 +24,14 @@ class Shell(RefiningVFeature):
                      feature["entities"],
                      feature["parameters"], strict, debug)
 
-    def _op(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]]) -> TopoDS_Shape:
+    def _op(self, s: TopoDS_Shape, entities: dict[str, list[TopoDS_Shape]], tracker: EntityTracker = None,
+            profiler: Profiler = None) -> TopoDS_Shape:
+        from OCC.Core.BRepOffsetAPI import BRepOffsetAPI_MakeThickSolid
+        from OCC.Core.TopTools import TopTools_ListOfShape
         faces = TopTools_ListOfShape()
-        for face in self.locate_faces(s, entities["faces"]):
-            faces.Append(face)
+        with profile_stage(profiler, "locate_faces"):
+            for face in self.get_target_faces(s, entities):
+                faces.Append(face)
 
         # =====================================================================
         if self.debug:
@@ -30,7 +40,7 @@ class Shell(RefiningVFeature):
             from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
             display.DisplayShape(s, color=Quantity_Color(0, 0, 0, Quantity_TOC_RGB), transparency=0.5, update=True)
             cnt = 0
-            for face in self.locate_faces(s, entities["faces"]):
+            for face in self.get_target_faces(s, entities):
                 display.DisplayShape(face, color=Quantity_Color(1, 0, 0, Quantity_TOC_RGB), update=True)
                 cnt += 1
             print("=====================================================================")
@@ -39,19 +49,22 @@ class Shell(RefiningVFeature):
             start_display()
         # =====================================================================
 
-        shell = BRepOffsetAPI_MakeThickSolid()
-        shell.MakeThickSolidByJoin(
-            s,
-            faces,
-            -1 * abs(self.thickness),
-            1e-5,
-            # BRepOffset_Skin,
-            # True,
-            # True,
-            # GeomAbs_Arc,
-            # True
-        )
-        s = shell.Shape()
+        with profile_stage(profiler, "shell"):
+            shell = BRepOffsetAPI_MakeThickSolid()
+            shell.MakeThickSolidByJoin(
+                s,
+                faces,
+                -1 * abs(self.thickness),
+                1e-5,
+                # BRepOffset_Skin,
+                # True,
+                # True,
+                # GeomAbs_Arc,
+                # True
+            )
+            s = shell.Shape()
+        if tracker is not None:
+            tracker.record(shell)
         return s
 
     def transform_param(self, translation, scale):
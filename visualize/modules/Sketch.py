@@ -1,17 +1,14 @@
 import copy
 import uuid
-import numpy as np
+from collections import OrderedDict
 
-from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Fuse
-from OCC.Core.TopTools import TopTools_ListOfShape
-from OCC.Core.gp import gp_Pnt, gp_Dir, gp_Pln, gp_Ax3
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeFace, BRepBuilderAPI_MakeWire
+import numpy as np
 
-from visualize.utils.occ_utils import get_bbox
 from visualize.modules.Curves import CurveBase, Circle, Line, Arc, BSpline
 from visualize.base.BaseVFeature import BaseVFeature
 from visualize.macro import NORM_FACTOR
 from visualize.utils.math_utils import denumericalize_unit_vector, numericalize_unit_vector
+from visualize.utils.shape_cache import canonical_hash
 
 
 # --------------------------------------------------
@@ -19,6 +16,12 @@ from visualize.utils.math_utils import denumericalize_unit_vector, numericalize_
 # DeepCAD (https://arxiv.org/abs/2105.09492), as this code is partially adapted from their work.
 # --------------------------------------------------
 
+# faces of profiles in the local XY frame (see `Face.create_local_profile`), shared by all sketches and keyed by
+# the profile content, so that identical profiles on different planes (or in different models) are built once
+LOCAL_FACE_CACHE = OrderedDict()
+LOCAL_FACE_CACHE_SIZE = 1024
+
+
 class Loop(BaseVFeature):
     """Sketch loop, a sequence of connected curves."""
 
@@ -91,25 +94,14 @@ class Loop(BaseVFeature):
         all_points = np.concatenate([child.bbox for child in self.curves], axis=0)
         return np.stack([np.min(all_points, axis=0), np.max(all_points, axis=0)], axis=0)
 
-    def create_loop(self, plane):
+    def create_local_loop(self):
+        """wire of the loop in the local XY frame, made of the (kept) local edges of the curves"""
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeWire
+        from OCC.Core.TopTools import TopTools_ListOfShape
         topo_wire = BRepBuilderAPI_MakeWire()
         occ_edges_list = TopTools_ListOfShape()
-        # =====================================================================
-        # from OCC.Display.SimpleGui import init_display
-        # display, start_display, add_menu, add_function_to_menu = init_display()
-        # topo_edge = self.curves[0].create_curve_3D()
-        # display.DisplayShape(topo_edge, color="red", update=True)
-        # if len(self.curves) > 1:
-        #     topo_edge = self.curves[1].create_curve_3D()
-        #     display.DisplayShape(topo_edge, color="green", update=True)
-        # for curve in self.curves[2:]:
-        #     topo_edge = curve.create_curve_3D()
-        #     display.DisplayShape(topo_edge, color="blue", update=True)
-        # start_display()
-        # =====================================================================
         for curve in self.curves:
-            topo_edge = curve.create_curve_3D(plane)
-            occ_edges_list.Append(topo_edge)
+            occ_edges_list.Append(curve.topo_ds_edge_from_2d_coord)
         topo_wire.Add(occ_edges_list)
         return topo_wire.Wire()
 
@@ -200,25 +192,37 @@ class Face(BaseVFeature):
         ind = np.lexsort(all_loops_bbox_min.transpose()[[1, 0]])
         self.loops = [self.loops[i] for i in ind]
 
-    def create_profile(self, plane):
-        origin = gp_Pnt(*plane["origin"])
-        normal = gp_Dir(*plane["normal"])
-        x_axis = gp_Dir(*plane["x"])
-        gp_face = gp_Pln(gp_Ax3(origin, normal, x_axis))
-
-        all_loops = [loop.create_loop(plane) for loop in self.loops]
-        # =====================================================================
-        # from OCC.Display.SimpleGui import init_display
-        # display, start_display, add_menu, add_function_to_menu = init_display()
-        # display.DisplayShape(all_loops[0], color="red", update=True)
-        # for loop in all_loops[1:]:
-        #     display.DisplayShape(loop, color="blue", update=True)
-        # start_display()
-        # =====================================================================
-        topo_face = BRepBuilderAPI_MakeFace(gp_face, all_loops[0])
+    def get_content_key(self) -> str:
+        """hash of the profile geometry, i.e. `back2json` without the IDs"""
+        data = self.back2json()
+        for loop in data["loops"]:
+            for curve in loop["loop_curves"]:
+                for key in ["id", "start_point_id", "end_point_id"]:
+                    curve.pop(key, None)
+        return canonical_hash(data)
+
+    def create_local_profile(self):
+        """face of the profile in the local XY frame, shared through `LOCAL_FACE_CACHE`"""
+        from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeFace
+        from OCC.Core.gp import gp_Pln
+        key = self.get_content_key()
+        if key in LOCAL_FACE_CACHE:
+            LOCAL_FACE_CACHE.move_to_end(key)
+            return LOCAL_FACE_CACHE[key]
+        all_loops = [loop.create_local_loop() for loop in self.loops]
+        topo_face = BRepBuilderAPI_MakeFace(gp_Pln(), all_loops[0])
         for loop in all_loops[1:]:
             topo_face.Add(loop.Reversed())
-        return topo_face.Face()
+        LOCAL_FACE_CACHE[key] = topo_face.Face()
+        if len(LOCAL_FACE_CACHE) > LOCAL_FACE_CACHE_SIZE:
+            LOCAL_FACE_CACHE.popitem(last=False)
+        return LOCAL_FACE_CACHE[key]
+
+    def create_profile(self, plane, location=None):
+        """face of the profile on `plane`: the local face placed by `location` (see `CurveBase.get_location`)"""
+        from OCC.Core.TopoDS import topods
+        location = CurveBase.get_location(plane) if location is None else location
+        return topods.Face(self.create_local_profile().Moved(location))
 
     def get_code(self, param: dict):
         ref_ids = param.get("ref_ids", set())
@@ -237,6 +241,7 @@ class Sketch(BaseVFeature):
         super().__init__(feat_name, feat_id, feat_type, parameters=None)
         self.faces = faces
         self.plane = plane
+        self._id_index = None  # ID -> owner / located topology, see `find_id`
 
     def to_deepcad_json(self):
         def array_to_xyz_dict(np_arr):
@@ -280,45 +285,95 @@ class Sketch(BaseVFeature):
                       copy.deepcopy(feature["plane"]))
 
     def create_sketch(self, return_union=False, plane=None):
-        if plane is None:
-            plane = self.plane
-        plane = copy.deepcopy(plane)
-
-        plane["normal"] = denumericalize_unit_vector(plane["normal"])
-        plane["x"] = denumericalize_unit_vector(plane["x"])
+        plane = self.get_denormalized_plane(plane)
+        location = CurveBase.get_location(plane)
 
         all_faces = []
         for profile in self.faces:
-            all_faces.append(profile.create_profile(plane))
+            all_faces.append(profile.create_profile(plane, location))
 
         if return_union:
-            union_face = all_faces[0]
-            for face in all_faces[1:]:
-                union_face = BRepAlgoAPI_Fuse(union_face, face).Shape()
-            return union_face
+            # non-destructive, the faces are shared through LOCAL_FACE_CACHE
+            from visualize.base.SketchBasedVFeature import SketchBasedVFeature
+            return SketchBasedVFeature.op_fuse_all(all_faces[0], all_faces[1:])
 
         return all_faces
 
+    def __get_id_index(self) -> dict:
+        if self._id_index is None:
+            owners = {}
+            for profile in self.faces:
+                owners.setdefault(profile.id, profile)
+                for loop in profile.loops:
+                    for curve in loop.curves:
+                        owners.setdefault(curve.id, curve)
+                        if curve.start_point is not None:
+                            owners.setdefault(curve.start_point_id, curve)
+                            owners.setdefault(curve.end_point_id, curve)
+            plane = self.get_denormalized_plane()
+            self._id_index = {"plane": plane, "location": CurveBase.get_location(plane), "owners": owners,
+                              "topo_ds": {}}
+        return self._id_index
+
     def find_id(self, the_id):
-        plane = copy.deepcopy(self.plane)
-        # ======= denormalize plane ========
-        plane["normal"] = denumericalize_unit_vector(plane["normal"])
-        plane["x"] = denumericalize_unit_vector(plane["x"])
-        # ==================================
-        for profile in self.faces:
-            if profile.id == the_id:
-                return profile.create_profile(plane)
-            for loop in profile.loops:
-                for curve in loop.curves:
-                    topo_ds = curve.find_topo_ds_by_id(the_id, plane)
-                    if topo_ds is not None:
-                        return topo_ds
-        return None
+        """
+        OCC topology of a profile (face), curve (edge) or point (vertex) ID in global coordinates, or None.
+        The ID index and the located topology are kept until the sketch is changed (see `drop_topo_ds`),
+        so all refining features of a build share them.
+        """
+        index = self.__get_id_index()
+        if the_id in index["topo_ds"]:
+            return index["topo_ds"][the_id]
+        owner = index["owners"].get(the_id)
+        if owner is None:
+            return None
+        if isinstance(owner, Face):
+            topo_ds = owner.create_profile(index["plane"], index["location"])
+        else:
+            topo_ds = owner.find_topo_ds_by_id(the_id, index["plane"], index["location"])
+        index["topo_ds"][the_id] = topo_ds
+        return topo_ds
 
     @property
     def bbox(self):
-        skt = self.create_sketch(return_union=True)
-        return get_bbox(skt)
+        """bounding box (min/max points) of the sketch in global coordinates, computed analytically"""
+        plane = self.get_denormalized_plane()
+        all_points = np.concatenate([curve.get_extreme_points(plane)
+                                     for face in self.faces for loop in face.loops for curve in loop.curves], axis=0)
+        return np.stack([np.min(all_points, axis=0), np.max(all_points, axis=0)], axis=0)
+
+    @property
+    def local_bbox(self) -> np.ndarray:
+        """2D bounding box (min/max points) of the sketch in its local frame"""
+        all_points = np.concatenate([loop.bbox for face in self.faces for loop in face.loops], axis=0)[:, :2]
+        return np.stack([np.min(all_points, axis=0), np.max(all_points, axis=0)], axis=0)
+
+    def get_denormalized_plane(self, plane=None) -> dict:
+        plane = copy.deepcopy(self.plane if plane is None else plane)
+        plane["normal"] = denumericalize_unit_vector(plane["normal"])
+        plane["x"] = denumericalize_unit_vector(plane["x"])
+        return plane
+
+    def get_bbox_corners(self) -> np.ndarray:
+        """global 3D corners of `local_bbox`, the sketch lies in their convex hull"""
+        plane = self.get_denormalized_plane()
+        (x_min, y_min), (x_max, y_max) = self.local_bbox
+        corners = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+        return CurveBase.local2global_array(corners, plane)
+
+    def __getstate__(self):
+        # the ID index holds OCC topology, it is rebuilt lazily after unpickling
+        state = self.__dict__.copy()
+        state["_id_index"] = None
+        return state
+
+    def drop_topo_ds(self):
+        """release the OCC topology held by this sketch and its curves"""
+        self._id_index = None
+        for face in self.faces:
+            for loop in face.loops:
+                for curve in loop.curves:
+                    curve.drop_topo_ds()
 
     def normalize(self, size=1.0):
         """(1)normalize the shape into unit cube (-1~1). """
@@ -327,6 +382,7 @@ class Sketch(BaseVFeature):
         self.transform_param(np.array([0, 0, 0]), scale)
 
     def transform_param(self, translation, scale):
+        self.drop_topo_ds()
         # 1. transform plane
         self.plane["origin"] = (np.array(self.plane["origin"]) + translation) * scale
         self.plane["origin"] = self.plane["origin"].tolist()
@@ -338,6 +394,7 @@ class Sketch(BaseVFeature):
                     curve.transform_param(translation, scale)
 
     def numericalize(self, n=256):
+        self.drop_topo_ds()
         # 1. transform plane
         self.plane["origin"] = ((np.array(self.plane["origin"]) * (n / 2))
                                 .round()
@@ -1,48 +1,222 @@
+from __future__ import annotations
+
+import copy
+import multiprocessing
+import time
+import warnings
+from concurrent.futures import Executor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING
+
+import numpy as np
+
 from visualize.base.RefiningVFeature import RefiningVFeature
 from visualize.macro import *
 from visualize.modules.Chamfer import Chamfer
-from visualize.modules.Extrude import *
+from visualize.modules.Extrude import Extrude
 from visualize.modules.Fillet import Fillet
 from visualize.modules.Revolve import Revolve
 from visualize.modules.Shell import Shell
 from visualize.modules.Sketch import Sketch
 from visualize.base.SketchBasedVFeature import SketchBasedVFeature
-from visualize.utils.occ_utils import clean_shape, get_bbox, is_shape_valid, get_mass, show_shape
+from visualize.isolation import DEFAULT_START_METHOD, DEFAULT_TIMEOUT
+from visualize.utils.profiler import Profiler, profile_stage
+from visualize.utils.shape_cache import ShapeCache, canonical_hash
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+
+# NOTE: OCC (and the OCC based utils) are only imported when a shape is actually built, so that parsing,
+# `back2json`, `get_code`, `numericalize` etc. work without loading OCC.
 
 
 class TripleWrapper:
-    def __init__(self, skt: Sketch, skt_op: SketchBasedVFeature, refines: list[RefiningVFeature], _clean_shape):
+    def __init__(self, skt: Sketch, skt_op: SketchBasedVFeature, refines: list[RefiningVFeature], _clean_shape,
+                 entity_tracking=False, profiler: Profiler = None):
         self.skt = skt
         self.skt_op = skt_op
         self.refines = refines
-        self._clean_shape = _clean_shape
+        if isinstance(_clean_shape, bool):
+            _clean_shape = CleanPolicy.PER_TRIPLE if _clean_shape else CleanPolicy.NONE
+        self._clean_shape = CleanPolicy(_clean_shape)
+        self.entity_tracking = entity_tracking
+        self.profiler = profiler
         self.boolean_type = BooleanOp[self.skt_op.parameters["operationType"]]
 
     def build(self) -> TopoDS_Shape:
-        s = self.skt_op.op(self.skt)
+        from visualize.utils.occ_utils import clean_shape
+        tracker = None
+        if self.entity_tracking:
+            # resolve the references of the refining features by the modeling history (see EntityTracker)
+            from visualize.utils.entity_tracker import EntityTracker
+            tracker = EntityTracker()
+        s = self.skt_op.op(self.skt, tracker, self.profiler)
         for r in self.refines:
-            s = r.op(s, self.skt, self.skt_op)
-        if self._clean_shape:
-            s = clean_shape(s)
+            if self._clean_shape == CleanPolicy.ON_DEMAND:
+                s, tracker = self.__refine_on_demand(r, s, tracker)
+            else:
+                s = r.op(s, self.skt, self.skt_op, tracker, self.profiler)
+        if self._clean_shape == CleanPolicy.PER_TRIPLE:
+            with profile_stage(self.profiler, "clean"):
+                s = clean_shape(s)
         return s
 
+    def __refine_on_demand(self, r: RefiningVFeature, s, tracker):
+        """
+        apply `r` to `s`, healing `s` only if it needs it: if it is not plausible, or if `r` fails on it (then `r`
+        is retried once on the healed shape). Returns the shape and the tracker for the following refines:
+        healing rebuilds the faces and edges, so references can not be tracked through it anymore.
+        """
+        from visualize.utils.occ_utils import clean_shape, is_shape_plausible
+        if is_shape_plausible(s):
+            try:
+                return r.op(s, self.skt, self.skt_op, tracker, self.profiler), tracker
+            except Exception:
+                pass
+        with profile_stage(self.profiler, "clean"):
+            s = clean_shape(s)
+        if tracker is not None:
+            warnings.warn(f"The shape was healed before `{r.feat_name}`, the references of the remaining refining "
+                          f"features of the triple are located geometrically instead of tracked.")
+        return r.op(s, self.skt, self.skt_op, None, self.profiler), None
+
+    def back2json(self) -> list[dict]:
+        return [self.skt.back2json(), self.skt_op.back2json()] + [r.back2json() for r in self.refines]
+
+    def to_json(self) -> dict:
+        """the triple as a standalone model in the format of `CADSequence.back2json`"""
+        features = [self.skt, self.skt_op] + self.refines
+        return {
+            "features": {feat.feat_id: feat.back2json() for feat in features},
+            "sequence": [{"index": idx, "type": feat.feat_type, "name": feat.feat_name, "feature_id": feat.feat_id}
+                         for idx, feat in enumerate(features)],
+        }
+
+    def get_cache_data(self) -> list[dict]:
+        """feature dicts which determine the local shape: feature names/ids and the boolean type are dropped,
+        so that identical triples of different models share the same cache entry"""
+        data = copy.deepcopy(self.back2json())
+        for feat in data:
+            feat.pop("name", None)
+            feat.pop("id", None)
+        data[1]["parameters"].pop("operationType", None)
+        return data
+
 
 class CADSequence(object):
-    def __init__(self, seq, _clean_shape, validate=True, strict=False, debug=False):
+    def __init__(self, seq, _clean_shape, validate=True, strict=False, debug=False, shape_cache: ShapeCache = None,
+                 entity_tracking=False, build_workers=0, fuse_runs=True, parallel_booleans=False, fuzzy_value=0.0,
+                 use_location=False, profile=False, build_executor: Executor = None):
         self.seq = seq
-        self._clean_shape = _clean_shape
-        self.validate = validate
+        if isinstance(_clean_shape, bool):
+            _clean_shape = CleanPolicy.PER_TRIPLE if _clean_shape else CleanPolicy.NONE
+        self._clean_shape = CleanPolicy(_clean_shape)  # True / False are "per_triple" / "none"
+        if isinstance(validate, bool):
+            validate = ValidationLevel.FULL if validate else ValidationLevel.NONE
+        self.validate = ValidationLevel(validate)  # True / False are "full" / "none"
         self.strict = strict
         self.debug = debug
+        self.shape_cache = shape_cache
+        self.entity_tracking = entity_tracking
+        self.build_workers = build_workers  # >1: build the local shapes of the triples in worker processes
+        # pool of these processes, kept across `create_CAD` calls. A pool passed by the caller is never shut down
+        self.build_executor = build_executor
+        self._own_executor = False
+        self.fuse_runs = fuse_runs  # fuse runs of consecutive ADD/NEW triples in one boolean operation
+        self.parallel_booleans = parallel_booleans  # OCC parallel mode of the booleans
+        self.fuzzy_value = fuzzy_value  # OCC fuzzy value of the booleans (0: disabled)
+        self.use_location = use_location  # see `SketchBasedVFeature.place`
+        self.profiler = Profiler() if profile else None  # stage timings, see `visualize.utils.profiler`
         self.triple_wrappers = self.__get_triple_wrappers()
+        # built shape and its bbox, memoized together with the triple signatures they were built from
+        self._shape = None
+        self._signatures = None  # with the boolean options for the shape, see `create_CAD`
+        self._bbox = None
+        self._bbox_signatures = None
+        # intermediate shapes kept for incremental rebuilds, see `create_CAD`
+        self._local_shapes = {}  # triple signature -> local shape
+        self._prefix_shapes = []  # (prefix signature, shape after the i-th boolean) per triple
+        self.validation_timings = {}  # seconds spent checking the "local" shapes / the "final" shape
+        # pickling: ship the built shape as OCC binary BRep (see `__getstate__`), read back on first use
+        self.pickle_shape = False
+        self._shape_brep = None
+
+    def get_build_options(self) -> dict:
+        """keyword arguments of `from_dict` that reproduce how this sequence is built"""
+        return {
+            "_clean_shape": self._clean_shape.value,
+            "validate": self.validate.value,
+            "strict": self.strict,
+            "debug": self.debug,
+            "shape_cache": self.shape_cache,
+            "entity_tracking": self.entity_tracking,
+            "build_workers": self.build_workers,
+            "fuse_runs": self.fuse_runs,
+            "parallel_booleans": self.parallel_booleans,
+            "fuzzy_value": self.fuzzy_value,
+            "use_location": self.use_location,
+            "profile": self.profiler is not None,
+        }
 
     @property
     def bbox(self):
-        s = self.create_CAD()
-        return get_bbox(s)
+        from visualize.utils.occ_utils import get_bbox
+        signatures = self.get_triple_signatures()
+        if self._bbox is None or self._bbox_signatures != signatures:
+            self._bbox = get_bbox(self.create_CAD())
+            self._bbox_signatures = signatures
+        return self._bbox.copy()
+
+    def __getstate__(self):
+        """
+        The features are pickled as they are (without their OCC handles, which are rebuilt lazily).
+        The shapes kept for incremental rebuilds are dropped, the built shape is only kept (as OCC binary BRep)
+        if `pickle_shape` is set.
+        """
+        state = self.__dict__.copy()
+        state["_local_shapes"] = {}
+        state["_prefix_shapes"] = []
+        state["_shape"] = None
+        state["build_executor"] = None
+        state["_own_executor"] = False
+        if self.pickle_shape and self._shape is not None:
+            from visualize.utils.occ_utils import shape_to_bytes
+            state["_shape_brep"] = shape_to_bytes(self._shape)
+        return state
+
+    def invalidate(self):
+        """
+        drop the memoized shapes and bbox. Edited features are detected by their signatures anyway,
+        this releases the shapes kept for incremental rebuilds.
+        """
+        self._shape = None
+        self._shape_brep = None
+        self._signatures = None
+        self._bbox = None
+        self._local_shapes = {}
+        self._prefix_shapes = []
+
+    def estimate_bbox(self) -> np.ndarray:
+        """
+        Conservative bounding box (min/max points) of the shape, computed analytically without building it:
+        the union of the sketch-based bodies, intersected by INTERSECT ones (REMOVE and refining features
+        only remove material, so they are ignored).
+        """
+        bbox = None
+        for wrapper in self.triple_wrappers:
+            local_bbox = wrapper.skt_op.estimate_bbox(wrapper.skt)
+            if bbox is None:
+                bbox = local_bbox
+            elif wrapper.boolean_type in [BooleanOp.NEW, BooleanOp.ADD]:
+                bbox = np.stack([np.minimum(bbox[0], local_bbox[0]), np.maximum(bbox[1], local_bbox[1])], axis=0)
+            elif wrapper.boolean_type == BooleanOp.INTERSECT:
+                bbox = np.stack([np.maximum(bbox[0], local_bbox[0]), np.minimum(bbox[1], local_bbox[1])], axis=0)
+        return bbox
 
     @staticmethod
-    def from_dict(json_data, _clean_shape=True, validate=True, strict=False, debug=False):
+    def from_dict(json_data, _clean_shape=True, validate=True, strict=False, debug=False, shape_cache=None,
+                  entity_tracking=False, build_workers=0, fuse_runs=True, parallel_booleans=False, fuzzy_value=0.0,
+                  use_location=False, profile=False, build_executor=None):
         seq = []
         for item in json_data["sequence"]:
             feature = json_data["features"][item["feature_id"]]
@@ -50,10 +224,10 @@ class CADSequence(object):
                 sketch = Sketch.from_dict(feature)
                 seq.append(sketch)
             if item["type"] == "extrude":
-                extrude = Extrude.from_dict(feature)
+                extrude = Extrude.from_dict(feature, use_location)
                 seq.append(extrude)
             elif item["type"] == "revolve":
-                revolve = Revolve.from_dict(feature)
+                revolve = Revolve.from_dict(feature, use_location)
                 seq.append(revolve)
             elif item["type"] == "chamfer":
                 chamfer = Chamfer.from_dict(feature, strict, debug)
@@ -64,19 +238,36 @@ class CADSequence(object):
             elif item["type"] == "shell":
                 shell = Shell.from_dict(feature, strict, debug)
                 seq.append(shell)
-        return CADSequence(seq, _clean_shape, validate, strict, debug)
+        return CADSequence(seq, _clean_shape, validate, strict, debug, shape_cache, entity_tracking, build_workers,
+                           fuse_runs, parallel_booleans, fuzzy_value, use_location, profile, build_executor)
 
-    def __check_shape(self, shape):
-        if self.validate:
-            if not is_shape_valid(shape):
-                raise ValueError("The created shape is invalid.")
+    def __check_shape(self, shape, final=False):
+        """check a local (or the final) shape according to `self.validate`, the time is kept in `validation_timings`"""
+        from visualize.utils.occ_utils import is_shape_plausible, is_shape_valid
+        if self.validate == ValidationLevel.NONE:
+            return
+        t = time.perf_counter()
+        try:
+            if self.validate == ValidationLevel.CHEAP or (self.validate == ValidationLevel.FINAL and not final):
+                if not is_shape_plausible(shape):
+                    raise ValueError("The created shape is invalid.")
+            else:
+                if not is_shape_valid(shape):
+                    raise ValueError("The created shape is invalid.")
+                if final:
+                    self.__check_shape_by_mass(shape)
+        finally:
+            timing, seconds = "final" if final else "local", time.perf_counter() - t
+            self.validation_timings[timing] = self.validation_timings.get(timing, 0.0) + seconds
+            if self.profiler is not None:
+                self.profiler.add(f"validate_{timing}", seconds)
 
     def __check_shape_by_mass(self, shape):
-        if self.validate:
-            mass = get_mass(shape)
-            if mass == 0.0:
-                raise ValueError("The created shape has zero mass, which is invalid.")
-            # print(f"{mass=}")
+        from visualize.utils.occ_utils import get_mass
+        mass = get_mass(shape)
+        if mass == 0.0:
+            raise ValueError("The created shape has zero mass, which is invalid.")
+        # print(f"{mass=}")
 
     def __get_triple_wrappers(self):
         _triples = []
@@ -101,45 +292,214 @@ class CADSequence(object):
             refines = []
             if len(p) > 2:
                 refines = p[2:]
-            wrapper = TripleWrapper(p[0], p[1], refines, self._clean_shape)
+            wrapper = TripleWrapper(p[0], p[1], refines, self._clean_shape, self.entity_tracking, self.profiler)
             wrappers.append(wrapper)
         if len(wrappers) == 0:
             raise ValueError("No valid pairs found in the sequence.")
         return wrappers
 
-    def create_CAD(self):
-        shape = self.triple_wrappers[0].build()
+    def __get_cache_key(self, data):
+        options = {"_clean_shape": self._clean_shape.value, "validate": self.validate.value, "strict": self.strict,
+                   "entity_tracking": self.entity_tracking}
+        return ShapeCache.key(data, options)
+
+    def build_triple(self, wrapper: TripleWrapper):
+        """build (or read from the shape cache) the checked local shape of a triple"""
+        from visualize.utils.occ_utils import show_shape
+        key = None
+        if self.shape_cache is not None:
+            key = self.__get_cache_key(wrapper.get_cache_data())
+            local_shape = self.shape_cache.get(key)
+            if local_shape is not None:
+                return local_shape
+        local_shape = wrapper.build()
         if self.debug:
-            show_shape(shape)
-        self.__check_shape(shape)
-        for wrapper in self.triple_wrappers[1:]:
-            local_shape = wrapper.build()
-            if self.debug:
-                show_shape(local_shape)
-            self.__check_shape(local_shape)
-            shape = SketchBasedVFeature.op_boolean(shape, local_shape, wrapper.boolean_type)
+            show_shape(local_shape)
+        self.__check_shape(local_shape)
+        if key is not None:
+            self.shape_cache.put(key, local_shape)
+        return local_shape
+
+    def get_build_executor(self) -> Executor:
+        """the pool of the `build_workers` processes, started on first use and kept until `close()`"""
+        if self.build_executor is None:
+            self.build_executor = ProcessPoolExecutor(max_workers=self.build_workers,
+                                                      mp_context=multiprocessing.get_context(DEFAULT_START_METHOD))
+            self._own_executor = True
+        return self.build_executor
+
+    def close(self):
+        """shut down the pool of the `build_workers` processes (unless it was passed by the caller)"""
+        if self._own_executor and self.build_executor is not None:
+            self.build_executor.shutdown()
+        self.build_executor = None
+        self._own_executor = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __build_triples_parallel(self, wrappers: dict[str, TripleWrapper]) -> dict[str, TopoDS_Shape]:
+        """
+        build the local shapes of `wrappers` (signature -> wrapper) concurrently, they are shipped back through
+        shared memory (see `visualize.utils.shape_transport`). The stage timings and validation timings of the
+        workers are merged into `profiler` and `validation_timings`.
+        """
+        from visualize.utils.shape_transport import new_handle, receive_shape, release_shape
+        options = self.get_build_options()
+        options.update(debug=False, build_workers=0)
+        handles = {signature: new_handle() for signature in wrappers}
+        try:
+            executor = self.get_build_executor()
+            futures = [executor.submit(_build_triple_to_brep, wrapper.to_json(), options, handles[signature])
+                       for signature, wrapper in wrappers.items()]
+            wait(futures)  # no segment is released while a worker may still write it
+            results = {signature: future.result() for signature, future in zip(wrappers, futures)}
+            for result in results.values():
+                if self.profiler is not None and result["profile"] is not None:
+                    self.profiler.merge(result["profile"])
+                for timing, seconds in result["validation_timings"].items():
+                    self.validation_timings[timing] = self.validation_timings.get(timing, 0.0) + seconds
+            # the workers return the filled handles, the copies in `handles` are still empty
+            return {signature: receive_shape(result["handle"]) for signature, result in results.items()}
+        except BrokenProcessPool:
+            self.close()  # a worker died, the next build starts a new pool
+            raise
+        finally:
+            for handle in handles.values():
+                release_shape(handle)
+
+    def get_boolean_options(self) -> list:
+        """the options which determine how the local shapes are combined"""
+        return [self.fuse_runs, self.fuzzy_value, self.parallel_booleans]
+
+    def get_triple_signatures(self) -> list[str]:
+        """content hash of every triple (its features and the build options), changes whenever a triple is edited"""
+        return [self.__get_cache_key(wrapper.get_cache_data()) for wrapper in self.triple_wrappers]
+
+    def create_CAD(self):
+        """
+        Build the shape. The local shape of every triple and the accumulated shape after every boolean are kept,
+        so after editing features only the triples from the first edited one onward are rebuilt, and unchanged
+        local shapes of later triples are reused for their booleans.
+        """
+        from visualize.utils.occ_utils import clean_shape, show_shape, shape_from_bytes
+        if self._shape_brep is not None:  # shipped by pickle
+            self._shape, self._shape_brep = shape_from_bytes(self._shape_brep), None
+        signatures = self.get_triple_signatures()
+        # the triple signatures cover the clean/validate options, the boolean options are not part of them
+        build_signatures = [signatures, self.get_boolean_options()]
+        if self._shape is not None and self._signatures == build_signatures:
+            return self._shape
+        self.validation_timings = {}
+        key = None
+        if self.shape_cache is not None:
+            key = self.__get_cache_key([[[w.get_cache_data(), w.boolean_type.value] for w in self.triple_wrappers],
+                                        self.get_boolean_options()])
+            shape = self.shape_cache.get(key)
+            if shape is not None:
+                self._shape = shape
+                self._signatures = build_signatures
+                return shape
+
+        prefix_signatures = []  # the prefix shapes also depend on the options of the booleans
+        for wrapper, signature in zip(self.triple_wrappers, signatures):
+            prev = prefix_signatures[-1] if prefix_signatures else self.get_boolean_options()
+            prefix_signatures.append(canonical_hash([prev, signature, wrapper.boolean_type.value]))
+        n_reused = 0  # the prefix shapes before the first edited triple are still valid
+        while (n_reused < min(len(self._prefix_shapes), len(prefix_signatures)) and
+               self._prefix_shapes[n_reused][0] == prefix_signatures[n_reused]):
+            n_reused += 1
+        while n_reused > 0 and self._prefix_shapes[n_reused - 1][1] is None:  # inside a fused run
+            n_reused -= 1
+
+        local_shapes = {s: self._local_shapes[s] for s in signatures if s in self._local_shapes}
+        to_build = {}
+        for wrapper, signature in zip(self.triple_wrappers[n_reused:], signatures[n_reused:]):
+            if signature not in local_shapes:
+                to_build.setdefault(signature, wrapper)
+        if self.build_workers > 1 and len(to_build) > 1 and not multiprocessing.current_process().daemon:
+            local_shapes.update(self.__build_triples_parallel(to_build))
+
+        def get_local_shape(idx):
+            if signatures[idx] not in local_shapes:
+                self.triple_wrappers[idx].skt.drop_topo_ds()  # the sketch may have been edited directly
+                local_shapes[signatures[idx]] = self.build_triple(self.triple_wrappers[idx])
+            return local_shapes[signatures[idx]]
+
+        prefix_shapes = self._prefix_shapes[:n_reused]
+        shape = prefix_shapes[-1][1] if prefix_shapes else None
+        i = n_reused
+        while i < len(self.triple_wrappers):
+            boolean_type = self.triple_wrappers[i].boolean_type
+            j = i + 1
+            if self.fuse_runs and (i == 0 or boolean_type in [BooleanOp.NEW, BooleanOp.ADD]):
+                while j < len(self.triple_wrappers) and self.triple_wrappers[j].boolean_type in [BooleanOp.NEW,
+                                                                                                  BooleanOp.ADD]:
+                    j += 1
+            tools = [get_local_shape(k) for k in range(i, j)]
+            if i == 0:
+                shape, tools = tools[0], tools[1:]
+            if len(tools) > 1:
+                with profile_stage(self.profiler, "boolean"):
+                    shape = SketchBasedVFeature.op_fuse_all(shape, tools, self.parallel_booleans, self.fuzzy_value)
+            elif len(tools) == 1:  # by the boolean of the tool's own triple, not of the triple starting the run
+                with profile_stage(self.profiler, "boolean"):
+                    shape = SketchBasedVFeature.op_boolean(shape, tools[0], self.triple_wrappers[j - 1].boolean_type,
+                                                           self.parallel_booleans, self.fuzzy_value)
             if shape is None:
                 raise ValueError("The created shape is invalid.")
-            if self.debug:
+            if self.debug and tools:
                 show_shape(shape)
+            # the shapes within a fused run are never built, only the shape after the run can be reused
+            prefix_shapes.extend((prefix_signatures[k], None) for k in range(i, j - 1))
+            prefix_shapes.append((prefix_signatures[j - 1], shape))
+            i = j
+        self._local_shapes = local_shapes
+        self._prefix_shapes = prefix_shapes
+        if self._clean_shape == CleanPolicy.FINAL:
+            with profile_stage(self.profiler, "clean"):
+                shape = clean_shape(shape)  # the prefix shapes stay uncleaned
 
-        self.__check_shape(shape)
-        self.__check_shape_by_mass(shape)
+        self.__check_shape(shape, final=True)
         # if self.validate:
         #     if not is_shape_valid(shape):
         #         raise ValueError("The created shape is invalid.")
+        if key is not None:
+            self.shape_cache.put(key, shape)
+        self._shape = shape
+        self._signatures = build_signatures
         return shape
 
-    def normalize(self, size=1.0):
-        """(1)normalize the shape into unit cube (-1~1). """
+    def create_CAD_isolated(self, timeout=DEFAULT_TIMEOUT, worker=None) -> dict:
+        """
+        Build the shape in a supervised worker process (see `visualize.isolation`), so that hanging or
+        crashing OCC kernels are reported as a "timeout"/"crash" result instead of stalling the caller.
+        On success, result["value"] is the created shape. Pass an `IsolatedWorker` to reuse its process.
+        """
+        from visualize.isolation import build_shape_isolated
+        return build_shape_isolated(self.back2json(), self.get_build_options(), timeout=timeout, worker=worker)
+
+    def normalize(self, size=1.0, exact_bbox=True):
+        """(1)normalize the shape into unit cube (-1~1).
+        With `exact_bbox=False`, the analytic `estimate_bbox()` is used instead and no shape is built."""
+        bbox = self.bbox if exact_bbox else self.estimate_bbox()
         # scale = size / np.max(np.abs(self.bbox))
-        scale = size * NORM_FACTOR / np.max(np.abs(self.bbox))
+        scale = size * NORM_FACTOR / np.max(np.abs(bbox))
         self.transform_param(np.array([0, 0, 0]), scale)
 
     def transform_param(self, translation: np.array, scale):
         assert len(translation) == 3 and isinstance(translation, np.ndarray)
         for item in self.seq:
             item.transform_param(translation, scale)
+        # a pure (positive) scaling scales the whole shape around the origin, so its bbox is still known
+        bbox = self._bbox
+        self.invalidate()  # every triple changed
+        if bbox is not None and not np.any(translation) and scale > 0:
+            self._bbox = bbox * scale
+            self._bbox_signatures = self.get_triple_signatures()
 
     def numericalize(self, n=256):
         """
@@ -159,6 +519,7 @@ class CADSequence(object):
         """
         for item in self.seq:
             item.numericalize(n)
+        self.invalidate()
 
     def back2json(self):
         _res = {
@@ -244,8 +605,9 @@ class CADSequence(object):
 
         return _code.replace("'", "\"")
 
-    def to_deepcad_json(self):
-        bbox = self.bbox.tolist()
+    def to_deepcad_json(self, exact_bbox=True):
+        """With `exact_bbox=False`, the bounding box is the analytic `estimate_bbox()` and no shape is built."""
+        bbox = self.bbox.tolist() if exact_bbox else self.estimate_bbox().tolist()
         max_corner, min_corner = bbox[0], bbox[1]
         cad_json = {
             "entities": {},
@@ -294,3 +656,15 @@ class CADSequence(object):
             idx += 1
             cad_json["entities"][ext_id] = ext_json
         return cad_json
+
+
+def _build_triple_to_brep(triple_json, build_options, handle) -> dict:
+    """build the local shape of a triple into `handle`, returns the filled handle and the timings of the build"""
+    from visualize.utils.shape_transport import send_shape
+    seq = CADSequence.from_dict(triple_json, **build_options)
+    handle = send_shape(seq.build_triple(seq.triple_wrappers[0]), handle)
+    return {
+        "handle": handle,
+        "profile": seq.profiler.to_json() if seq.profiler is not None else None,
+        "validation_timings": seq.validation_timings,
+    }
@@ -0,0 +1,138 @@
+"""
+History based naming of sketch entities.
+
+Refining features reference sketch entities (profile, curve and point IDs) together with a `capType`.
+`EntityTracker` records the modeling history of a triple, i.e. the sweep of the sketch and the refining
+features applied after it, and resolves such references to sub-shapes of the current solid by replaying
+that history instead of searching the whole solid geometrically. Whenever a reference can not be tracked,
+`resolve` returns None and the caller falls back to the geometric search.
+"""
+from __future__ import annotations
+
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.BRepGProp import brepgprop
+from OCC.Core.GProp import GProp_GProps
+from OCC.Core.TopAbs import TopAbs_VERTEX, TopAbs_EDGE, TopAbs_FACE
+from OCC.Core.TopExp import topexp
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.TopTools import TopTools_IndexedMapOfShape, TopTools_ListIteratorOfListOfShape
+from OCC.Core.TopoDS import TopoDS_Shape, topods
+
+from visualize.macro import CapType
+from visualize.utils.occ_compare_edge_utils import is_equal
+
+
+def to_shape_list(shapes) -> list[TopoDS_Shape]:
+    """python list of a TopTools_ListOfShape"""
+    if isinstance(shapes, list):
+        return shapes
+    result = []
+    iterator = TopTools_ListIteratorOfListOfShape(shapes)
+    while iterator.More():
+        result.append(iterator.Value())
+        iterator.Next()
+    return result
+
+
+def get_sub_shapes(s: TopoDS_Shape, shape_type) -> TopTools_IndexedMapOfShape:
+    sub_shapes = TopTools_IndexedMapOfShape()
+    topexp.MapShapes(s, shape_type, sub_shapes)
+    return sub_shapes
+
+
+def is_same_geometry(s1: TopoDS_Shape, s2: TopoDS_Shape, tol=1e-4) -> bool:
+    shape_type = s1.ShapeType()
+    if shape_type != s2.ShapeType():
+        return False
+    if shape_type == TopAbs_VERTEX:
+        return BRep_Tool.Pnt(topods.Vertex(s1)).IsEqual(BRep_Tool.Pnt(topods.Vertex(s2)), tol)
+    if shape_type == TopAbs_EDGE:
+        return is_equal(topods.Edge(s1), topods.Edge(s2), tol)
+    if shape_type == TopAbs_FACE:
+        props1, props2 = GProp_GProps(), GProp_GProps()
+        brepgprop.SurfaceProperties(s1, props1)
+        brepgprop.SurfaceProperties(s2, props2)
+        return abs(props1.Mass() - props2.Mass()) < tol and props1.CentreOfMass().IsEqual(props2.CentreOfMass(), tol)
+    return False
+
+
+class EntityTracker(object):
+    """
+    History of a single triple. The sketch-based feature calls `record_sweep` with its prism/revolution maker,
+    every refining feature calls `record` with its maker after it is applied.
+    """
+
+    def __init__(self):
+        self.base = None  # the sketch shape which is swept
+        self.placement = None  # BRepBuilderAPI_Transform / TopLoc_Location applied to `base` before the sweep, or None
+        self.sweep = None  # BRepPrimAPI_MakePrism / BRepPrimAPI_MakeRevol
+        self.cap_sides = {}  # CapType.START / CapType.END -> "first" / "last" end of the sweep
+        self.history = []  # makers of the refining features, in order
+        self._shape = None  # the shape `_sub_shapes` belong to
+        self._sub_shapes = None
+
+    def record_sweep(self, base: TopoDS_Shape, sweep, placement=None, cap_sides: dict = None):
+        self.base = base
+        self.sweep = sweep
+        self.placement = placement
+        self.cap_sides = cap_sides or {}
+        self.history = []
+
+    def record(self, maker):
+        self.history.append(maker)
+
+    def find_base_shape(self, ref: TopoDS_Shape):
+        """sub-shape of the swept sketch shape which coincides with `ref`, or None"""
+        sub_shapes = get_sub_shapes(self.base, ref.ShapeType())
+        for i in range(1, sub_shapes.Extent() + 1):
+            if is_same_geometry(sub_shapes.FindKey(i), ref):
+                return sub_shapes.FindKey(i)
+        return None
+
+    def __replay(self, ref: TopoDS_Shape, cap_type: CapType) -> list[TopoDS_Shape]:
+        base_shape = self.find_base_shape(ref)
+        if base_shape is None:
+            return []
+        if isinstance(self.placement, TopLoc_Location):
+            base_shape = base_shape.Moved(self.placement)
+        elif self.placement is not None:
+            base_shape = self.placement.ModifiedShape(base_shape)
+        if cap_type == CapType.SWEPT:
+            shapes = to_shape_list(self.sweep.Generated(base_shape))
+        elif self.cap_sides.get(cap_type) == "first":
+            shapes = [self.sweep.FirstShape(base_shape)]
+        elif self.cap_sides.get(cap_type) == "last":
+            shapes = [self.sweep.LastShape(base_shape)]
+        else:
+            return []
+        for maker in self.history:
+            next_shapes = []
+            for shape in shapes:
+                if maker.IsDeleted(shape):
+                    continue
+                modified = to_shape_list(maker.Modified(shape))
+                next_shapes.extend(modified if modified else [shape])
+            shapes = next_shapes
+        return shapes
+
+    def __is_sub_shape(self, shape: TopoDS_Shape, s: TopoDS_Shape) -> bool:
+        if self._shape is not s:
+            self._shape = s
+            self._sub_shapes = {TopAbs_EDGE: get_sub_shapes(s, TopAbs_EDGE), TopAbs_FACE: get_sub_shapes(s, TopAbs_FACE)}
+        sub_shapes = self._sub_shapes.get(shape.ShapeType())
+        return sub_shapes is not None and sub_shapes.Contains(shape)
+
+    def resolve(self, ref: TopoDS_Shape, cap_type: CapType, s: TopoDS_Shape):
+        """
+        edges/faces of the current shape `s` that the sketch shape `ref` became at `cap_type`,
+        or None if they can not be tracked.
+        """
+        if self.sweep is None:
+            return None
+        try:
+            shapes = self.__replay(ref, cap_type)
+            if not shapes or not all(self.__is_sub_shape(shape, s) for shape in shapes):
+                return None
+        except Exception:
+            return None
+        return shapes
@@ -1,3 +1,6 @@
+import itertools
+import math
+
 import numpy as np
 
 
@@ -26,3 +29,135 @@ def denumericalize_unit_vector(vec, return_np=False):
     if return_np:
         return vec
     return vec.tolist()
+
+
+def circumcircle_2d(p1, p2, p3):
+    """center and radius of the circle through three 2D points, None if the points are collinear"""
+    (ax, ay), (bx, by), (cx, cy) = p1[:2], p2[:2], p3[:2]
+    d = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if abs(d) < 1e-12:
+        return None
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    ux = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d
+    uy = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d
+    center = np.array([ux, uy])
+    return center, float(np.linalg.norm(np.array([ax, ay]) - center))
+
+
+def sample_interpolated_spline(points, samples_per_span=16):
+    """
+    Sample the cubic spline interpolating `points` (chord-length parametrization, not-a-knot end
+    conditions, i.e. the curve built by GeomAPI_Interpolate). Two points give a line, three a parabola.
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n <= 2:
+        return points
+    chords = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    keep = np.concatenate([[True], chords > 1e-12])
+    points, chords = points[keep], chords[chords > 1e-12]
+    n = len(points)
+    if n <= 2:
+        return points
+    h = chords  # chord-length parametrization: the knot spacings are the chord lengths
+    slopes = np.diff(points, axis=0) / h[:, None]
+
+    # solve for the second derivatives m at the knots
+    a = np.zeros((n, n))
+    b = np.zeros((n, points.shape[1]))
+    a[1:-1, :-2][np.arange(n - 2), np.arange(n - 2)] = h[:-1]
+    a[1:-1, 1:-1][np.arange(n - 2), np.arange(n - 2)] = 2 * (h[:-1] + h[1:])
+    a[1:-1, 2:][np.arange(n - 2), np.arange(n - 2)] = h[1:]
+    b[1:-1] = 6 * (slopes[1:] - slopes[:-1])
+    if n == 3:  # parabola: constant second derivative
+        a[0, :2] = [1, -1]
+        a[-1, -2:] = [1, -1]
+    else:  # not-a-knot: continuous third derivative at the second and the penultimate knot
+        a[0, :3] = [h[1], -(h[0] + h[1]), h[0]]
+        a[-1, -3:] = [h[-1], -(h[-2] + h[-1]), h[-2]]
+    m = np.linalg.solve(a, b)
+
+    # evaluate every span at `samples_per_span` parameters
+    u = np.linspace(0, 1, samples_per_span, endpoint=False)[None, :, None]  # (1, s, 1)
+    hh = h[:, None, None]
+    p0, p1 = points[:-1, None, :], points[1:, None, :]
+    m0, m1 = m[:-1, None, :], m[1:, None, :]
+    values = ((1 - u) * p0 + u * p1 +
+              hh ** 2 / 6 * (((1 - u) ** 3 - (1 - u)) * m0 + (u ** 3 - u) * m1))
+    return np.concatenate([values.reshape(-1, points.shape[1]), points[-1:]], axis=0)
+
+
+def arc_sweep(start_angle, mid_angle, end_angle):
+    """counter-clockwise start angle and sweep angle (0~2pi) of the arc through the points at the given angles"""
+    two_pi = 2 * np.pi
+    sweep = (end_angle - start_angle) % two_pi
+    # the arc goes counter-clockwise from start to end iff the midpoint lies within that sweep
+    if (mid_angle - start_angle) % two_pi > sweep:
+        start_angle, sweep = end_angle, two_pi - sweep
+    return start_angle, sweep
+
+
+def arc_extreme_angles(start_angle, mid_angle, end_angle, x_axis, y_axis):
+    """
+    Angles of the points of an arc (parametrized as cos(a) * x_axis + sin(a) * y_axis around its center)
+    which bound it: both ends, and the axis-aligned extrema of its circle lying within the arc.
+    """
+    two_pi = 2 * np.pi
+    start_angle, sweep = arc_sweep(start_angle, mid_angle, end_angle)
+    x_axis, y_axis = np.asarray(x_axis, dtype=float), np.asarray(y_axis, dtype=float)
+    extrema = np.arctan2(y_axis, x_axis)
+    candidates = np.concatenate([extrema, extrema + np.pi])
+    inside = (candidates - start_angle) % two_pi <= sweep
+    return np.concatenate([[start_angle, start_angle + sweep], candidates[inside]])
+
+
+def bbox_overlaps(bboxes1, bboxes2, tol=1e-4) -> np.ndarray:
+    """
+    (N, M) boolean matrix telling whether the i-th box of `bboxes1` (N, 2, 3) and the j-th box of `bboxes2`
+    (M, 2, 3), both given as min/max points, overlap when enlarged by `tol`.
+    """
+    bboxes1 = np.asarray(bboxes1, dtype=float).reshape(-1, 2, 3)
+    bboxes2 = np.asarray(bboxes2, dtype=float).reshape(-1, 2, 3)
+    min1, max1 = bboxes1[:, None, 0], bboxes1[:, None, 1]
+    min2, max2 = bboxes2[None, :, 0], bboxes2[None, :, 1]
+    return np.all((min1 <= max2 + tol) & (min2 <= max1 + tol), axis=-1)
+
+
+def pair_points(points, tol=1e-4):
+    """
+    Pair up coincident points: in order, each unpaired point is paired with the first later unpaired point
+    within `tol`. Returns the list of index pairs, or None if a point has no partner.
+    Points are hashed into a grid of cell size `tol`, so each point is only compared to points of the
+    neighbouring cells instead of all the others.
+    """
+    if len(points) == 0:
+        return []
+    points = np.asarray(points, dtype=float).reshape(len(points), -1)
+    cells = [tuple(cell) for cell in np.floor(points / max(tol, 1e-12)).astype(np.int64).tolist()]
+    points = [tuple(p) for p in points.tolist()]
+    grid = {}
+    for i, cell in enumerate(cells):
+        grid.setdefault(cell, []).append(i)  # indices in each cell stay sorted
+    offsets = list(itertools.product([-1, 0, 1], repeat=len(cells[0])))
+
+    paired = [False] * len(points)
+    pairs = []
+    for i in range(len(points)):
+        if paired[i]:
+            continue
+        grid[cells[i]].remove(i)
+        partner = None
+        for offset in offsets:
+            neighbour = tuple(c + o for c, o in zip(cells[i], offset))
+            for j in grid.get(neighbour, ()):
+                if partner is not None and j > partner:
+                    break
+                if math.dist(points[i], points[j]) <= tol:
+                    partner = j
+                    break  # the first match of a cell has its smallest index
+        if partner is None:
+            return None
+        grid[cells[partner]].remove(partner)
+        paired[i] = paired[partner] = True
+        pairs.append((i, partner))
+    return pairs
@@ -1,3 +1,4 @@
+import numpy as np
 from OCC.Core.BRep import BRep_Tool
 from OCC.Core.BRepAdaptor import BRepAdaptor_Curve
 from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Section
@@ -69,15 +70,59 @@ def is_equal_any(edge: TopoDS_Edge, any_edges_in, tol=1e-4):
     """
     This function uses a non-strict approach to determine whether two edge equal.
     """
-    res = False
     for _edge in any_edges_in:
         if is_equal(_edge, edge, tol):
-            res = True
-    return res
+            return True
+    return False
+
+
+def edge_signature(an_edge: TopoDS_Edge) -> tuple[int, np.ndarray]:
+    """
+    Curve type and the (3, 3) start / mid / end points of an edge, as compared by `is_equal`.
+    The mid point is only used for circles; points which are not used (or not supported) are NaN.
+    """
+    c_type = curve_type(an_edge)
+    points = np.full((3, 3), np.nan)
+    if c_type in [GeomAbs_Line, GeomAbs_BSplineCurve]:
+        start_point, end_point = curve_param(an_edge, c_type)
+        points[0] = start_point.Coord()
+        points[2] = end_point.Coord()
+    elif c_type == GeomAbs_Circle:
+        start_point, mid_point, end_point = curve_param(an_edge, c_type)
+        points[0], points[1], points[2] = start_point.Coord(), mid_point.Coord(), end_point.Coord()
+    return int(c_type), points
+
+
+def get_edge_signatures(edges) -> dict[str, np.ndarray]:
+    """signatures of `edges`, computed once so that they can be matched against each other in bulk"""
+    types, points = [], []
+    for edge in edges:
+        c_type, pts = edge_signature(edge)
+        types.append(c_type)
+        points.append(pts)
+    return {"types": np.array(types, dtype=int).reshape(-1), "points": np.array(points).reshape(-1, 3, 3)}
+
+
+def match_edge_signatures(signatures1: dict, signatures2: dict, tol=1e-4) -> np.ndarray:
+    """
+    (N, M) boolean matrix of `is_equal` between N and M edges, given their signatures (see `get_edge_signatures`).
+    Edges of curve types which are not supported by `is_equal` never match.
+    """
+    p1, p2 = signatures1["points"][:, None], signatures2["points"][None, :]
+
+    def close(i, j):
+        return np.linalg.norm(p1[..., i, :] - p2[..., j, :], axis=-1) <= tol  # False for NaN
+
+    same_type = signatures1["types"][:, None] == signatures2["types"][None, :]
+    same_ends = (close(0, 0) & close(2, 2)) | (close(0, 2) & close(2, 0))
+    is_circle = signatures1["types"][:, None] == int(GeomAbs_Circle)
+    same_mid = np.where(is_circle, close(1, 1), True)
+    return same_type & same_ends & same_mid
 
 
 def is_edges_intersected(edge1: TopoDS_Edge, edge2: TopoDS_Edge) -> bool:
-    sec = BRepAlgoAPI_Section(edge1, edge2)
+    sec = BRepAlgoAPI_Section(edge1, edge2, False)
+    sec.SetNonDestructive(True)  # the reference edges may be shared with the cached sketch faces
     sec.Build()
     comm_shape = sec.Shape()
     explorer = TopExp_Explorer(comm_shape, TopAbs_EDGE)
@@ -87,11 +132,10 @@ def is_edges_intersected(edge1: TopoDS_Edge, edge2: TopoDS_Edge) -> bool:
 
 
 def is_edges_intersected_any(edge: TopoDS_Edge, any_edges_in) -> bool:
-    res = False
     for _edge in any_edges_in:
         if is_edges_intersected(_edge, edge):
-            res = True
-    return res
+            return True
+    return False
 
 # def print_edge(an_edge: TopoDS_Edge):
 #     curve = BRepAdaptor_Curve(an_edge)
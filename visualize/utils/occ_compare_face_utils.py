@@ -11,6 +11,8 @@ from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Section
 from OCC.Core.TopoDS import topods, TopoDS_Face, TopoDS_Edge
 from OCC.Core.gp import gp_Pnt
 
+from visualize.utils.math_utils import pair_points
+
 
 def pnt2list(_, return_np_array=True):
     res = [_.X(), _.Y(), _.Z()]
@@ -46,15 +48,43 @@ def get_plane(face: TopoDS_Face, return_np_array=True):
         }
 
 
+def get_face_planes(faces) -> dict[str, np.ndarray]:
+    """surface types of `faces`, and normals / origins of the planar ones (NaN for the others)"""
+    types = np.zeros(len(faces), dtype=int)
+    normals = np.full((len(faces), 3), np.nan)
+    origins = np.full((len(faces), 3), np.nan)
+    for i, face in enumerate(faces):
+        adaptor = BRepAdaptor_Surface(face)
+        types[i] = int(adaptor.GetType())
+        if adaptor.GetType() == GeomAbs_Plane:
+            gp_ax3 = adaptor.Plane().Position()
+            normals[i] = pnt2list(gp_ax3.Direction())
+            origins[i] = pnt2list(gp_ax3.Location())
+    return {"types": types, "normals": normals, "origins": origins}
+
+
+def match_face_planes(planes1: dict, planes2: dict, tol: float = 1e-4) -> np.ndarray:
+    """
+    (N, M) boolean matrix of the surface checks of `is_faces_intersected` for all pairs of faces, given
+    their `get_face_planes`: same surface type, and coplanar if they are planes.
+    """
+    same_type = planes1["types"][:, None] == planes2["types"][None, :]
+    n1, o1 = planes1["normals"][:, None], planes1["origins"][:, None]
+    n2, o2 = planes2["normals"][None, :], planes2["origins"][None, :]
+    parallel = np.linalg.norm(np.cross(n1, n2), axis=-1) <= tol
+    same_offset = np.abs(np.sum(n2 * (o1 - o2), axis=-1)) <= tol
+    is_plane = planes1["types"][:, None] == int(GeomAbs_Plane)
+    return same_type & np.where(is_plane, parallel & same_offset, True)
+
+
 def is_faces_intersected_any(face: TopoDS_Face, any_faces_in) -> bool:
     """
     This function uses a non-strict approach to determine whether two faces intersect.
     """
-    res = False
     for _face in any_faces_in:
         if is_faces_intersected(face, _face):
-            res = True
-    return res
+            return True
+    return False
 
 
 def get_start_end_points(edge: TopoDS_Edge) -> Tuple[gp_Pnt, gp_Pnt]:
@@ -92,7 +122,20 @@ def is_faces_intersected(
         if abs(np.dot(plane2["normal"], plane1["origin"] - plane2["origin"])) > tol:
             return False
 
-    sec = BRepAlgoAPI_Section(face1, face2)
+    return is_section_closed(face1, face2, tol)
+
+
+def is_section_closed(
+        face1: TopoDS_Face,
+        face2: TopoDS_Face,
+        tol: float = 1e-4,
+) -> bool:
+    """
+    Return True if the intersection curve of two faces is closed (the section part of `is_faces_intersected`,
+    the surface checks are left to the caller, see `match_face_planes`).
+    """
+    sec = BRepAlgoAPI_Section(face1, face2, False)
+    sec.SetNonDestructive(True)  # the reference faces may be shared with the cached sketch faces
     sec.Build()
     if not sec.IsDone():
         return False
@@ -120,20 +163,9 @@ def is_faces_intersected(
     except Exception:
         pass
 
+    # every end point of the section edges must coincide with another one
     vertices = []
     for edge in edges:
         p0, p1 = get_start_end_points(edge)
-        vertices.extend([p0, p1])
-
-    while vertices:
-        v = vertices.pop(0)
-        matched = False
-        for i, u in enumerate(vertices):
-            if u.IsEqual(v, tol):
-                vertices.pop(i)
-                matched = True
-                break
-        if not matched:
-            return False
-
-    return True
+        vertices.extend([pnt2list(p0, False), pnt2list(p1, False)])
+    return pair_points(vertices, tol) is not None
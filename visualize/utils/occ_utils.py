@@ -1,18 +1,25 @@
+import os
+import tempfile
+
 import numpy as np
 from OCC.Core.BRepBndLib import brepbndlib
 from OCC.Core.BRepCheck import BRepCheck_Analyzer
 from OCC.Core.BRepGProp import brepgprop
+from OCC.Core.BinTools import bintools
 from OCC.Core.Bnd import Bnd_Box
 from OCC.Core.GProp import GProp_GProps
 from OCC.Core.ShapeFix import ShapeFix_Shape
 from OCC.Core.ShapeUpgrade import ShapeUpgrade_UnifySameDomain
 from OCC.Core.TopoDS import TopoDS_Shape
-from OCC.Core.V3d import V3d_DirectionalLight, V3d_TypeOfOrientation
-from OCC.Display.SimpleGui import init_display
+
+from visualize.utils.shape_transport import get_transport_dir
 
 
 def clean_shape(shape):
-    fixer = ShapeFix_Shape(shape)
+    """heal `shape`. It is copied first, as `ShapeFix_Shape` modifies (e.g. the tolerances of) sub-shapes in place,
+    which may be shared with other shapes, e.g. the cached sketch faces (see `LOCAL_FACE_CACHE`)"""
+    from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Copy
+    fixer = ShapeFix_Shape(BRepBuilderAPI_Copy(shape).Shape())
     fixer.Perform()
     fixed = fixer.Shape()
 
@@ -30,7 +37,19 @@ def get_bbox(shape: TopoDS_Shape):
     return np.stack([min_corner, max_corner], axis=0)
 
 
+def get_bboxes(shapes: list[TopoDS_Shape]) -> np.ndarray:
+    """(N, 2, 3) bounding boxes of `shapes`, boxes of shapes without geometry are infinite"""
+    bboxes = np.tile(np.array([[-np.inf] * 3, [np.inf] * 3]), (len(shapes), 1, 1))
+    for i, shape in enumerate(shapes):
+        bounding_box = Bnd_Box()
+        brepbndlib.Add(shape, bounding_box)
+        if not bounding_box.IsVoid():
+            bboxes[i] = np.array(bounding_box.Get()).reshape(2, 3)
+    return bboxes
+
+
 def set_light(display):
+    from OCC.Core.V3d import V3d_DirectionalLight, V3d_TypeOfOrientation
     light = V3d_DirectionalLight()
     light.SetDirection(V3d_TypeOfOrientation(5))
     light.SetIntensity(0.8)
@@ -42,6 +61,23 @@ def is_shape_valid(shape):
     return analyzer.IsValid()
 
 
+def is_shape_plausible(shape: TopoDS_Shape, min_extent=1e-6):
+    """
+    cheap check: not null, at least one solid and a bounding box with non-zero volume (every extent above
+    `min_extent`). The box is computed without the shape tolerances, which would enlarge flat shapes.
+    """
+    from OCC.Core.TopAbs import TopAbs_SOLID
+    from OCC.Core.TopExp import TopExp_Explorer
+    if shape is None or shape.IsNull() or not TopExp_Explorer(shape, TopAbs_SOLID).More():
+        return False
+    bounding_box = Bnd_Box()
+    brepbndlib.AddOptimal(shape, bounding_box, False, False)
+    if bounding_box.IsVoid():
+        return False
+    bbox = np.array(bounding_box.Get()).reshape(2, 3)
+    return bool(np.all(bbox[1] - bbox[0] > min_extent))
+
+
 def get_mass(shape: TopoDS_Shape):
     props = GProp_GProps()
     brepgprop.VolumeProperties(shape, props)
@@ -49,7 +85,45 @@ def get_mass(shape: TopoDS_Shape):
     return mass
 
 
+def write_brep(shape: TopoDS_Shape, path):
+    """write shape in OCC binary BRep format"""
+    if not bintools.Write(shape, str(path)):
+        raise IOError(f"Failed to write BRep file `{path}`.")
+
+
+def read_brep(path) -> TopoDS_Shape:
+    shape = TopoDS_Shape()
+    bintools.Read(shape, str(path))
+    if shape.IsNull():
+        raise IOError(f"Failed to read BRep file `{path}`.")
+    return shape
+
+
+def shape_to_bytes(shape: TopoDS_Shape) -> bytes:
+    """OCC binary BRep of a shape"""
+    with tempfile.TemporaryDirectory(dir=get_transport_dir()) as tmp_dir:
+        path = os.path.join(tmp_dir, "shape.brep")
+        write_brep(shape, path)
+        with open(path, "rb") as fp:
+            return fp.read()
+
+
+def shape_from_bytes(data: bytes) -> TopoDS_Shape:
+    """shape of an OCC binary BRep, see `shape_to_bytes`"""
+    with tempfile.TemporaryDirectory(dir=get_transport_dir()) as tmp_dir:
+        path = os.path.join(tmp_dir, "shape.brep")
+        with open(path, "wb") as fp:
+            fp.write(data)
+        return read_brep(path)
+
+
+def write_step(shape: TopoDS_Shape, path):
+    from OCC.Extend.DataExchange import write_step_file
+    write_step_file(shape, str(path))
+
+
 def show_shape(shape):
+    from OCC.Display.SimpleGui import init_display
     display, start_display, add_menu, add_function_to_menu = init_display()
     set_light(display)
     display.DisplayShape(shape, update=True)
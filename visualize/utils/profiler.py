@@ -0,0 +1,77 @@
+"""
+Stage-level timing of shape builds.
+
+`CADSequence.from_dict(..., profile=True)` gives the sequence a `Profiler`, which is handed to the triples,
+the sketch-based and the refining features. Each of them records the wall-clock time of its stages:
+
+    sketch              building the sketch faces
+    extrude / revolve   the sweep
+    resolve_entities    `RefiningVFeature.resolve_entities_to_topods`
+    locate_edges        locating the target edges of fillets/chamfers on the solid
+    locate_faces        locating the target faces of shells on the solid
+    fillet / chamfer / shell
+                        the refining kernels
+    clean               `clean_shape`
+    boolean             `op_boolean` / `op_fuse_all`
+    validate_local / validate_final
+                        the checks of the local / the final shape (see `ValidationLevel`)
+
+Stats (count, total, p50, p95, max in seconds) are exported per stage with `get_stats` / `to_json`, and
+profiles of several models are aggregated with `merge`. Stages may be nested, e.g. `locate_edges` runs within
+the time of its refining feature.
+"""
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+
+class Profiler(object):
+    def __init__(self):
+        self.samples = {}  # stage -> list of seconds
+
+    @contextmanager
+    def stage(self, name):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def merge(self, other):
+        """add the samples of another `Profiler` (or of its `to_json()`)"""
+        samples = other.samples if isinstance(other, Profiler) else other["samples"]
+        for name, seconds in samples.items():
+            self.samples.setdefault(name, []).extend(seconds)
+
+    def reset(self):
+        self.samples = {}
+
+    def get_stats(self) -> dict[str, dict]:
+        stats = {}
+        for name, seconds in self.samples.items():
+            seconds = np.array(seconds)
+            stats[name] = {
+                "count": len(seconds),
+                "total": float(seconds.sum()),
+                "p50": float(np.percentile(seconds, 50)),
+                "p95": float(np.percentile(seconds, 95)),
+                "max": float(seconds.max()),
+            }
+        return stats
+
+    def to_json(self) -> dict:
+        return {"stats": self.get_stats(), "samples": self.samples}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(self.to_json(), fp, indent=2)
+
+
+def profile_stage(profiler: Profiler, name):
+    """`profiler.stage(name)`, or a no-op if `profiler` is None"""
+    return nullcontext() if profiler is None else profiler.stage(name)
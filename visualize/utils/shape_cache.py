@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from OCC.Core.TopoDS import TopoDS_Shape
+
+
+def _to_builtin(o):
+    if hasattr(o, "tolist"):  # numpy arrays and scalars
+        return o.tolist()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def canonical_hash(data) -> str:
+    """sha256 of the canonical JSON representation of `data` (sorted keys, no whitespace)"""
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"), default=_to_builtin)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ShapeCache(object):
+    """
+    Persistent, content-addressed cache of built shapes.
+
+    Keys are canonical hashes of feature dicts (as produced by `back2json`) together with the build
+    options, values are stored in OCC binary BRep format under `cache_dir`. The cache is bounded to
+    `max_bytes`, least recently used entries are evicted first. The cache directory can be shared
+    by several processes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._size = None  # estimated size of the cache, re-scanned before eviction
+
+    @staticmethod
+    def key(data, options=None) -> str:
+        return canonical_hash({"data": data, "options": options or {}})
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.brep"
+
+    def __contains__(self, key: str):
+        return self._path(key).exists()
+
+    def get(self, key: str):
+        """return the cached shape of `key`, or None if it is not cached"""
+        from visualize.utils.occ_utils import read_brep
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            shape = read_brep(path)
+        except (OSError, IOError):
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return shape
+
+    def put(self, key: str, shape: TopoDS_Shape):
+        from visualize.utils.occ_utils import write_brep
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        write_brep(shape, tmp_path)
+        os.replace(tmp_path, path)
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += path.stat().st_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.brep"):
+            try:
+                stat = path.stat()
+            except OSError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, target_bytes=None):
+        """remove least recently used entries until the cache is at most `target_bytes` (default 90% of max)"""
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries(), key=lambda x: x[0])
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        self.evict(target_bytes=0)
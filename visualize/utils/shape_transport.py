@@ -0,0 +1,66 @@
+"""
+Shared-memory transport of built shapes between processes.
+
+A shape is handed over as OCC binary BRep written into a shared-memory backed file (on /dev/shm, or in the
+temp directory where there is no such filesystem), and only a small picklable handle is sent to the receiver,
+which reads the shape back from that file. The BRep never goes through pickle or a pipe. OCC only reads and
+writes BRep from/to files, so a file on a memory filesystem avoids the extra copies a
+`multiprocessing.shared_memory` buffer would need.
+
+    handle = send_shape(shape)          # sender, e.g. a worker process
+    shape = receive_shape(handle)       # receiver, removes the segment unless release=False
+
+The receiver may also create the handle with `new_handle()` and pass it to the sender, so that it owns
+the segment and can `release_shape` it even if the sender fails. The sender fills in the size of the segment
+in its own copy of the handle, so it should send that copy back to be received: the receiver checks the size,
+so that a missing or truncated segment (e.g. /dev/shm running full) raises a clear error.
+"""
+import os
+import tempfile
+import uuid
+
+SHM_DIR = "/dev/shm"
+
+
+def get_transport_dir() -> str:
+    """directory of the segments: /dev/shm if available, the temp directory otherwise"""
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return tempfile.gettempdir()
+
+
+def new_handle(transport_dir=None) -> dict:
+    """handle of a new, still empty segment"""
+    path = os.path.join(transport_dir or get_transport_dir(), f"visualize-shape-{uuid.uuid4().hex}.brep")
+    return {"path": path, "size": 0}
+
+
+def send_shape(shape, handle: dict = None) -> dict:
+    """write `shape` into the segment of `handle` (a new one if None) and return the handle"""
+    from visualize.utils.occ_utils import write_brep
+    handle = new_handle() if handle is None else handle
+    write_brep(shape, handle["path"])
+    handle["size"] = os.path.getsize(handle["path"])
+    return handle
+
+
+def receive_shape(handle: dict, release=True):
+    """read the shape of `handle`, the segment is removed afterwards if `release`"""
+    from visualize.utils.occ_utils import read_brep
+    try:
+        size = os.path.getsize(handle["path"]) if os.path.exists(handle["path"]) else None
+        if size is None or size != handle["size"] or size == 0:
+            raise IOError(f"Shape segment `{handle['path']}` is missing or incomplete "
+                          f"({size} of {handle['size']} bytes).")
+        return read_brep(handle["path"])
+    finally:
+        if release:
+            release_shape(handle)
+
+
+def release_shape(handle: dict):
+    """remove the segment of `handle`, if it exists"""
+    try:
+        os.remove(handle["path"])
+    except FileNotFoundError:
+        pass